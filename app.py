@@ -1,26 +1,49 @@
+import logging
+import time
 from flask import Flask
 from flask_cors import CORS
-from extensions import db, cache
+from extensions import db, cache, compressor, password_hasher, recorder, profiler, assets
+from response_pipeline import FastJSONProvider
 from config import Config
 
 cors = CORS()
 
 def create_app():
-    """Create and configure the Flask application."""
+    """Create and configure the Flask application.
+
+    Schema creation and tip seeding are not part of worker boot; run `flask init-db` once per deployment.
+    """
+    timings = {}
+    started = phase_start = time.perf_counter()
+    def mark(phase):
+        nonlocal phase_start
+        now = time.perf_counter(); timings[phase] = round((now - phase_start) * 1000, 1); phase_start = now
+
     app = Flask(__name__, template_folder='templates', static_folder='static')
     app.config.from_object(Config)
 
     # Add Cache Config
     cache_config = {
         "CACHE_TYPE": "SimpleCache", # Uses in-memory cache
-        "CACHE_DEFAULT_TIMEOUT": 300 # Cache for 5 minutes (300 seconds)
+        "CACHE_DEFAULT_TIMEOUT": 300, # Cache for 5 minutes (300 seconds)
+        "CACHE_THRESHOLD": 5000 # Room for cached upstream responses of every tracked city
     }
     app.config.from_mapping(cache_config)
 
+    if app.config.get('JSON_FAST_ENCODER'):
+        app.json = FastJSONProvider(app)
+    mark('config')
+
     # Initialize extensions with app
     db.init_app(app)
     cache.init_app(app)
     cors.init_app(app)
+    compressor.init_app(app)
+    password_hasher.init_app(app)
+    recorder.init_app(app)
+    profiler.init_app(app)
+    assets.init_app(app)
+    mark('extensions')
 
     # Import and register blueprints
     from routes.main import main_bp
@@ -31,14 +54,29 @@ def create_app():
     app.register_blueprint(auth_bp)
     app.register_blueprint(api_bp)
 
+    from routes.live import live_hub
+    live_hub.init_app(app)
+    from routes.rankings import city_rankings
+    city_rankings.init_app(app)
+    mark('blueprints')
+
+    from commands import register_commands
+    register_commands(app)
+    mark('commands')
+
+    timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+    app.extensions['startup_timings'] = timings
+    logging.getLogger(__name__).info(f"App created in {timings['total']} ms: {timings}")
+    return app
+
+def init_database(app):
+    """Create tables and seed default data (idempotent)."""
     with app.app_context():
         # This is where models are safe to import and use
         from models import Tip
         db.create_all()
         seed_tips(db)
 
-    return app
-
 def seed_tips(database):
     """Seed the database with an expanded list of tips if it's empty."""
     from models import Tip
@@ -76,4 +114,5 @@ def seed_tips(database):
 
 if __name__ == '__main__':
     app = create_app()
+    init_database(app)
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,146 @@
+# assets.py
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import threading
+from flask import request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+from response_pipeline import brotli
+
+# Optional minifiers; without them JS is shipped as-is and CSS gets a conservative comment/whitespace pass
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+ASSET_EXTENSIONS = ('.js', '.css')
+MANIFEST_NAME = 'manifest.json'
+
+logger = logging.getLogger(__name__)
+
+
+# Comments, quoted strings and url(...) tokens; only the CSS between them is rewritten by the fallback
+CSS_TOKEN = re.compile(r'(/\*.*?\*/|"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|url\([^)]*\))', re.S)
+
+
+def _minify_css(source):
+    parts, gap = [], []
+
+    def flush():
+        text = re.sub(r'\s+', ' ', ''.join(gap)); gap.clear()
+        parts.append(re.sub(r'\s*([{};,])\s*', r'\1', text))
+
+    for i, piece in enumerate(CSS_TOKEN.split(source)):
+        if not i % 2: gap.append(piece)
+        elif piece.startswith('/*'): gap.append(' ') # A comment separates tokens like whitespace does
+        else: flush(); parts.append(piece) # Strings and url() are copied verbatim
+    flush()
+    return ''.join(parts).strip()
+
+
+def minify(source, ext):
+    """Minifies JS/CSS source text."""
+    if ext == '.js':
+        return rjsmin.jsmin(source) if rjsmin else source
+    return rcssmin.cssmin(source) if rcssmin else _minify_css(source)
+
+
+def build_assets(static_dir, dist_dir):
+    """Minifies and content-hashes every JS/CSS file under static_dir into dist_dir.
+
+    Each output (`js/map.<hash>.js`) gets `.gz` and, when brotli is installed, `.br` siblings.
+    `manifest.json` maps source names to hashed names; it is written last so a half-finished build
+    is never picked up. Returns the manifest.
+    """
+    manifest = {}
+    dist_abs = os.path.abspath(dist_dir)
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(root, d)) != dist_abs)
+        for name in sorted(files):
+            stem, ext = os.path.splitext(name)
+            if ext not in ASSET_EXTENSIONS: continue
+            src = os.path.join(root, name)
+            logical = os.path.relpath(src, static_dir).replace(os.sep, '/')
+            with open(src, encoding='utf-8') as f: data = minify(f.read(), ext).encode('utf-8')
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            hashed = f"{os.path.dirname(logical) + '/' if os.path.dirname(logical) else ''}{stem}.{digest}{ext}"
+            out = os.path.join(dist_dir, hashed)
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+            variants = {'': data, '.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None: variants['.br'] = brotli.compress(data, quality=11)
+            for suffix, payload in variants.items():
+                with open(out + suffix, 'wb') as f: f.write(payload)
+            manifest[logical] = hashed
+            logger.info(f"Asset {logical} -> {hashed} ({os.path.getsize(src)} -> {len(data)} bytes, gzip {len(variants['.gz'])})")
+    tmp_path = os.path.join(dist_dir, MANIFEST_NAME + '.tmp')
+    with open(tmp_path, 'w') as f: json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(dist_dir, MANIFEST_NAME))
+    return manifest
+
+
+class AssetPipeline:
+    """Serves fingerprinted, precompressed assets built by `flask build-assets`.
+
+    Templates call `asset_url('js/map.js')`, which resolves to `/assets/js/map.<hash>.js` when the
+    manifest lists the file and to the plain static URL otherwise (e.g. in development before a
+    build). Hashed files never change, so they are sent with `Cache-Control: immutable` and a
+    one-year max-age, and browsers stop revalidating them on every navigation. The precompressed
+    `.br`/`.gz` copy matching Accept-Encoding is sent as-is; a front proxy can also serve
+    ASSETS_DIST_DIR directly under `/assets/` to keep this traffic off the Python workers entirely.
+    """
+
+    def __init__(self):
+        self.dist_dir = 'static/dist'
+        self.max_age = 31536000
+        self._manifest = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.dist_dir = os.path.join(app.root_path, app.config.get('ASSETS_DIST_DIR', self.dist_dir))
+        self.max_age = app.config.get('ASSETS_MAX_AGE', self.max_age)
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+        app.jinja_env.globals['asset_url'] = self.url
+        app.extensions['assets'] = self
+
+    def manifest(self):
+        """The current manifest; reloaded only when a build has rewritten it."""
+        try: mtime = os.stat(os.path.join(self.dist_dir, MANIFEST_NAME)).st_mtime
+        except FileNotFoundError: return {}
+        if self._mtime != mtime:
+            with self._lock:
+                if self._mtime != mtime:
+                    with open(os.path.join(self.dist_dir, MANIFEST_NAME)) as f: self._manifest = json.load(f)
+                    self._mtime = mtime
+        return self._manifest
+
+    def url(self, filename):
+        hashed = self.manifest().get(filename)
+        if hashed is None: return url_for('static', filename=filename)
+        return url_for('assets', filename=hashed)
+
+    def serve(self, filename):
+        accepted = request.accept_encodings
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            path = safe_join(self.dist_dir, filename + suffix)
+            if accepted[encoding] and path and os.path.isfile(path):
+                response = send_from_directory(self.dist_dir, filename + suffix, max_age=self.max_age,
+                                               mimetype=mimetypes.guess_type(filename)[0])
+                response.content_encoding = encoding
+                break
+        else:
+            response = send_from_directory(self.dist_dir, filename, max_age=self.max_age)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
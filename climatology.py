@@ -0,0 +1,114 @@
+# climatology.py
+import logging
+import math
+import os
+import threading
+
+# numpy/pandas are imported inside the functions that need them so importing this module stays cheap
+
+POLLUTANTS = ['AQI', 'PM2.5', 'PM10', 'NO', 'NO2', 'NOx', 'NH3', 'CO', 'SO2', 'O3', 'Benzene', 'Toluene', 'Xylene']
+STATS = ['mean', 'median', 'p10', 'p90', 'days', 'exceedance_days']
+# Daily limits used for exceedance counts (CPCB 24h standards; CO in mg/m³ as in city_day.csv, AQI = "Poor" or worse)
+EXCEEDANCE_LIMITS = {'AQI': 200, 'PM2.5': 60, 'PM10': 100, 'NO2': 80, 'SO2': 80, 'O3': 100, 'CO': 2, 'NH3': 400}
+
+logger = logging.getLogger(__name__)
+
+_store = {'mtime': None, 'data': None, 'missing_logged': False}  # data: (cube, city -> row index)
+_lock = threading.Lock()
+
+
+def build_cube(csv_path, out_path):
+    """Aggregates city_day.csv into a city × month × pollutant × stat float32 cube saved as .npz."""
+    import numpy as np
+    import pandas as pd
+
+    df = pd.read_csv(csv_path, usecols=['City', 'Date'] + POLLUTANTS, parse_dates=['Date'])
+    df['Month'] = df['Date'].dt.month
+    long = df.melt(id_vars=['City', 'Month'], value_vars=POLLUTANTS, var_name='Pollutant', value_name='Value').dropna(subset=['Value'])
+    long['Exceeds'] = long['Value'] > long['Pollutant'].map(EXCEEDANCE_LIMITS)
+
+    grouped = long.groupby(['City', 'Month', 'Pollutant'])
+    summary = grouped['Value'].agg(mean='mean', median='median', days='count')
+    quantiles = grouped['Value'].quantile([0.1, 0.9]).unstack()
+    summary['p10'] = quantiles[0.1]; summary['p90'] = quantiles[0.9]
+    summary['exceedance_days'] = grouped['Exceeds'].sum()
+    # Pollutants without a limit have no meaningful exceedance count
+    summary.loc[~summary.index.get_level_values('Pollutant').isin(list(EXCEEDANCE_LIMITS)), 'exceedance_days'] = np.nan
+
+    cities = sorted(df['City'].unique())
+    city_pos = pd.Index(cities).get_indexer(summary.index.get_level_values('City'))
+    month_pos = summary.index.get_level_values('Month').to_numpy() - 1
+    pollutant_pos = pd.Index(POLLUTANTS).get_indexer(summary.index.get_level_values('Pollutant'))
+
+    cube = np.full((len(cities), 12, len(POLLUTANTS), len(STATS)), np.nan, dtype=np.float32)
+    cube[city_pos, month_pos, pollutant_pos, :] = summary[STATS].to_numpy(dtype=np.float32)
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, cube=cube, cities=np.array(cities), pollutants=np.array(POLLUTANTS), stats=np.array(STATS))
+    os.replace(tmp_path, out_path) # Running workers reload on the new mtime and must never see a half-written file
+    logger.info(f"Climatology cube {cube.shape} written to {out_path} from {len(df)} rows.")
+    return cube.shape
+
+
+def load_cube(path):
+    """Returns (cube, city -> row index); reloads the file only when `flask build-climatology` has rewritten it.
+
+    None (logged once) while the cube has not been built.
+    """
+    try: mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        if not _store['missing_logged']:
+            logger.warning(f"Climatology cube {path} not found; run `flask build-climatology`.")
+            _store['missing_logged'] = True
+        return None
+    if _store['mtime'] != mtime:
+        with _lock:
+            if _store['mtime'] != mtime:
+                try:
+                    import numpy as np
+                    with np.load(path) as data:
+                        cube = data['cube']
+                        _store['data'] = (cube, {str(city).lower(): i for i, city in enumerate(data['cities'])})
+                    logger.info(f"Climatology cube {cube.shape} loaded from {path}.")
+                except Exception as e:
+                    logger.error(f"Error loading climatology cube {path}: {e}", exc_info=True)
+                _store['mtime'] = mtime # A broken file is retried once it is rewritten, not on every lookup
+    return _store['data']
+
+
+def _city_row(path, city):
+    loaded = load_cube(path)
+    if loaded is None: return None, None
+    cube, index = loaded
+    return cube, index.get(city.strip().lower())
+
+
+def _clean(value):
+    value = float(value)
+    return None if math.isnan(value) else round(value, 2)
+
+
+def city_climatology(path, city):
+    """Returns {month: {pollutant: {stat: value}}} for a city, or None if the city is not in the cube."""
+    cube, i = _city_row(path, city)
+    if i is None: return None
+    months = {}
+    for m in range(12):
+        months[m + 1] = {p: {s: _clean(cube[i, m, pi, si]) for si, s in enumerate(STATS)}
+                         for pi, p in enumerate(POLLUTANTS) if not math.isnan(cube[i, m, pi, STATS.index('days')])}
+    return months
+
+
+def compare_to_typical(path, city, aqi, month):
+    """Compares a current AQI reading with the city's historical distribution for that month."""
+    cube, i = _city_row(path, city)
+    if i is None or not isinstance(aqi, (int, float)): return None
+    _, median, p10, p90 = (float(v) for v in cube[i, month - 1, POLLUTANTS.index('AQI'), :4])
+    if math.isnan(median) or median <= 0: return None
+    if aqi > p90: label = 'Much higher than usual'
+    elif aqi < p10: label = 'Much lower than usual'
+    elif aqi > median * 1.15: label = 'Higher than usual'
+    elif aqi < median * 0.85: label = 'Lower than usual'
+    else: label = 'Typical'
+    return {'typical_aqi': round(median), 'p10': round(p10), 'p90': round(p90),
+            'ratio': round(aqi / median, 2), 'label': label}
@@ -0,0 +1,230 @@
+# commands.py
+import csv
+import os
+import statistics
+import threading
+import time
+import uuid
+import click
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from flask.cli import with_appcontext
+from flask.json.provider import DefaultJSONProvider
+
+from response_pipeline import compress_bytes, orjson, brotli
+
+
+def register_commands(app):
+    """Attaches the project's `flask <command>` CLI entries to the app."""
+    app.cli.add_command(init_db)
+    app.cli.add_command(build_climatology)
+    app.cli.add_command(compact_readings)
+    app.cli.add_command(forecast_aqi)
+    app.cli.add_command(build_heatmap)
+    app.cli.add_command(build_assets)
+    app.cli.add_command(export_history)
+    app.cli.add_command(bench_payloads)
+    app.cli.add_command(bench_login)
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db():
+    """Creates database tables and seeds the default tips (safe to re-run)."""
+    from app import init_database
+    init_database(current_app)
+    click.echo("Database initialized.")
+
+
+@click.command('build-climatology')
+@click.option('--csv', 'csv_path', default=None, help='Daily city data (defaults to CITY_DAY_CSV).')
+@click.option('--out', 'out_path', default=None, help='Output .npz (defaults to CLIMATOLOGY_PATH).')
+@with_appcontext
+def build_climatology(csv_path, out_path):
+    """Precomputes the city × month × pollutant climatology cube from city_day.csv."""
+    from climatology import build_cube
+    csv_path = csv_path or current_app.config['CITY_DAY_CSV']; out_path = out_path or current_app.config['CLIMATOLOGY_PATH']
+    started = time.perf_counter()
+    shape = build_cube(csv_path, out_path)
+    click.echo(f"Climatology cube {shape} written to {out_path} in {time.perf_counter() - started:.2f} s.")
+
+
+@click.command('compact-readings')
+@with_appcontext
+def compact_readings():
+    """Folds closed hourly reading logs into daily columnar partitions (run periodically, e.g. from cron)."""
+    from extensions import recorder
+    recorder.flush()
+    segments, rows = recorder.compact()
+    click.echo(f"Compacted {segments} log segments ({rows} readings).")
+
+
+@click.command('forecast-aqi')
+@click.option('--out', 'out_path', default=None, help='Forecast store (defaults to AQI_FORECAST_PATH).')
+@with_appcontext
+def forecast_aqi(out_path):
+    """Batch job: forecasts next-24h/48h AQI for every tracked city (schedule it, e.g. hourly from cron)."""
+    from extensions import recorder
+    from forecaster import run_forecast_job
+    since = int(time.time()) - current_app.config['AQI_FORECAST_RECENT_DAYS'] * 86400
+    recorded = [(r['city'], r['dt'], r['aqi']) for r in recorder.iter_readings(start=since)]
+    store = run_forecast_job(current_app.config['CITY_DAY_CSV'], out_path or current_app.config['AQI_FORECAST_PATH'], recorded)
+    click.echo(f"Forecast {len(store['cities'])} cities ({store['skipped_outdated']} skipped: no recent readings) from {store['training_rows']} training rows; MAE {store['mae']}.")
+
+
+@click.command('build-heatmap')
+@click.option('--out', 'out_path', default=None, help='Binary grid (defaults to HEATMAP_PATH).')
+@with_appcontext
+def build_heatmap(out_path):
+    """Interpolates the latest recorded AQI of every known location onto the map grid (schedule it, e.g. every 15 min)."""
+    from extensions import recorder
+    from heatmap import build_heatmap as build
+    cfg = current_app.config
+    recorder.flush()
+    readings = recorder.iter_readings(start=int(time.time()) - cfg['HEATMAP_MAX_AGE'])
+    try:
+        info = build(readings, out_path or cfg['HEATMAP_PATH'], cfg['HEATMAP_BBOX'], cfg['HEATMAP_RESOLUTION'],
+                     cfg['HEATMAP_POWER'], cfg['HEATMAP_MAX_DISTANCE_KM'])
+    except ValueError as e: raise click.ClickException(str(e))
+    click.echo(f"AQI grid {info['width']}x{info['height']} from {info['stations']} stations ({info['bytes']} bytes).")
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets():
+    """Minifies, fingerprints and precompresses static JS/CSS (run on every deploy, before starting workers)."""
+    from assets import build_assets as build
+    dist_dir = os.path.join(current_app.root_path, current_app.config['ASSETS_DIST_DIR'])
+    manifest = build(current_app.static_folder, dist_dir)
+    click.echo(f"Built {len(manifest)} assets into {dist_dir}.")
+
+
+@click.command('export-history')
+@click.option('--cities', default=None, help='Comma-separated city names (default: all).')
+@click.option('--start', default=None, help='First date, YYYY-MM-DD.')
+@click.option('--end', default=None, help='Last date, YYYY-MM-DD (inclusive).')
+@click.option('--pollutants', default=None, help='Comma-separated pollutant columns (default: all).')
+@click.option('--buckets', default=None, help='Comma-separated AQI buckets, e.g. "Poor,Very Poor".')
+@click.option('--format', 'fmt', default='csv', type=click.Choice(['csv', 'ndjson', 'parquet']))
+@click.option('--out', 'out_path', default='-', help='Output file (default: stdout).')
+@with_appcontext
+def export_history(cities, start, end, pollutants, buckets, fmt, out_path):
+    """Streams a filtered extract of CITY_DAY_CSV (same filters as /api/export) with flat memory use."""
+    from exporter import parse_export_query, iter_export
+    try: query = parse_export_query({'cities': cities, 'start': start, 'end': end, 'pollutants': pollutants,
+                                     'buckets': buckets, 'format': fmt})
+    except ValueError as e: raise click.BadParameter(str(e))
+    chunks = iter_export(current_app.config['CITY_DAY_CSV'], query, current_app.config['EXPORT_CHUNK_ROWS'])
+    with click.open_file(out_path, 'wb') as out:
+        written = 0
+        for chunk in chunks: out.write(chunk); written += len(chunk)
+    if out_path != '-': click.echo(f"Wrote {written} bytes to {out_path}.")
+
+
+def _sample_city(name, i):
+    # Shape mirrors a fetch_aqi result with the fetch_weather result merged in (map/city_data payloads)
+    return {
+        'aqi': 80 + i, 'main_pollutant': 'PM2.5', 'city': name, 'geo': [28.61 + i / 10, 77.21 + i / 10],
+        'pm25': 41.3 + i, 'pm10': 88.12, 'no': 0.4, 'no2': 22.75, 'so2': 6.1, 'co': 701.0, 'o3': 54.2, 'nh3': 3.9,
+        'dt': 1700000000 + i, 'updated': '14 Nov 2023, 10:13 PM',
+        'weather': {'temp': 24, 'feels_like': 25, 'pressure': 1012, 'humidity': 61, 'wind_speed': 7.2, 'visibility': 4.0,
+                    'description': 'Haze', 'icon': '50d', 'sunrise': '06:41 AM', 'sunset': '05:29 PM', 'dt': 1700000100 + i},
+    }
+
+
+def _bench_payloads(history_rows):
+    cities = [f"City {i}" for i in range(30)]
+    payloads = {
+        '/api/map_cities_data': [_sample_city(c, i) for i, c in enumerate(cities[:12])],
+        '/api/top_cities_aqi': {
+            'india': [{'city': c, 'aqi': 100 + i, 'dt': 1700000000, 'category': {'category': 'Moderate', 'description': 'Breathing discomfort to sensitive groups.', 'color_class': 'bg-orange-500/20 text-orange-300 border-orange-500', 'chartColor': '#f97316'}} for i, c in enumerate(cities[:15])],
+            'world': [{'city': c, 'aqi': 40 + i, 'dt': 1700000000, 'category': {'category': 'Good', 'description': 'Minimal impact.', 'color_class': 'bg-green-500/20 text-green-300 border-green-500', 'chartColor': '#34d399'}} for i, c in enumerate(cities[15:])],
+        },
+    }
+    try:
+        with open('data/city_day.csv', newline='') as f:
+            reader = csv.DictReader(f)
+            payloads[f'history ({history_rows} city_day rows)'] = [row for _, row in zip(range(history_rows), reader)]
+    except FileNotFoundError:
+        pass
+    return payloads
+
+
+def _timed(fn, repeat):
+    start = time.process_time()
+    for _ in range(repeat): result = fn()
+    return result, (time.process_time() - start) / repeat * 1000
+
+
+@click.command('bench-payloads')
+@click.option('--repeat', default=200, show_default=True, help='Iterations per measurement.')
+@click.option('--history-rows', default=5000, show_default=True, help='city_day.csv rows in the history payload.')
+@click.option('--level', default=6, show_default=True, help='Compression level.')
+@with_appcontext
+def bench_payloads(repeat, history_rows, level):
+    """Reports bytes on the wire and CPU ms per response for JSON providers and compressors.
+
+    Both providers are timed through `response()`, the path jsonify uses, so the numbers include the
+    arguments Flask actually passes.
+    """
+    app = current_app._get_current_object()
+    stdlib = DefaultJSONProvider(app)
+    encodings = ['gzip'] + (['br'] if brotli is not None else [])
+    for name, payload in _bench_payloads(history_rows).items():
+        response, json_ms = _timed(lambda: stdlib.response(payload), repeat)
+        raw = response.get_data()
+        click.echo(f"{name}: {len(raw)} bytes raw")
+        click.echo(f"  {type(stdlib).__name__:<19} {json_ms:8.3f} ms")
+        if type(app.json) is not DefaultJSONProvider:
+            _, app_ms = _timed(lambda: app.json.response(payload), repeat)
+            engine = 'orjson' if orjson is not None else 'stdlib json'
+            click.echo(f"  {type(app.json).__name__:<19} {app_ms:8.3f} ms  ({json_ms - app_ms:+.3f} ms saved, {engine})")
+        for encoding in encodings:
+            body, ms = _timed(lambda: compress_bytes(raw, encoding, level), repeat)
+            click.echo(f"  {encoding:<6} {len(body):>8} bytes ({100 - 100 * len(body) / len(raw):5.1f}% saved), {ms:8.3f} ms CPU")
+
+
+def _latency_summary(samples):
+    samples = sorted(samples)
+    return f"median {statistics.median(samples):7.2f} ms, p95 {samples[int(len(samples) * 0.95) - 1]:7.2f} ms ({len(samples)} requests)"
+
+
+@click.command('bench-login')
+@click.option('--logins', default=40, show_default=True, help='Logins in the storm.')
+@click.option('--concurrency', default=8, show_default=True, help='Concurrent login threads.')
+@click.option('--probes', default=50, show_default=True, help='Baseline requests to the unrelated endpoint.')
+@with_appcontext
+def bench_login(logins, concurrency, probes):
+    """Measures login throughput and the latency added to an unrelated endpoint ('/') during a login storm."""
+    from extensions import db
+    from models import User
+    app = current_app._get_current_object()
+    email, password = f"bench-{uuid.uuid4().hex[:8]}@example.invalid", 'bench-password'
+    user = User(full_name='Login Bench', email=email); user.set_password(password)
+    db.session.add(user); db.session.commit()
+
+    def login_once(_):
+        with app.test_client() as c: return c.post('/api/login', data={'email': email, 'password': password}).status_code
+
+    def probe(latencies, until=None, count=None):
+        with app.test_client() as c:
+            while (count is not None and len(latencies) < count) or (until is not None and not until.is_set()):
+                t0 = time.perf_counter(); c.get('/'); latencies.append((time.perf_counter() - t0) * 1000)
+
+    try:
+        idle = []; probe(idle, count=probes)
+        during, storm_done = [], threading.Event()
+        prober = threading.Thread(target=probe, args=(during, storm_done)); prober.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool: statuses = list(pool.map(login_once, range(logins)))
+        elapsed = time.perf_counter() - started
+        storm_done.set(); prober.join()
+    finally:
+        db.session.delete(user); db.session.commit()
+
+    mode = f"{app.config.get('PASSWORD_HASH_WORKERS')} pool workers" if app.config.get('PASSWORD_HASH_WORKERS') else 'inline'
+    click.echo(f"Hashing: {app.config.get('PASSWORD_HASH_METHOD')} ({mode})")
+    click.echo(f"Logins: {logins} in {elapsed:.2f} s = {logins / elapsed:.1f}/s; statuses {dict((s, statuses.count(s)) for s in set(statuses))}")
+    click.echo(f"'/' idle:        {_latency_summary(idle)}")
+    if during: click.echo(f"'/' during storm: {_latency_summary(during)}")
+
@@ -9,4 +9,97 @@ class Config:
     OPENWEATHER_API_KEY = 'Enter API Key'
     
     # NEW: Geocoding API endpoint
-    GEOCODING_API_URL = "http://api.openweathermap.org/geo/1.0/direct"
\ No newline at end of file
+    GEOCODING_API_URL = "http://api.openweathermap.org/geo/1.0/direct"
+
+    # Freshness (seconds) of each upstream data source; drives Cache-Control max-age
+    UPSTREAM_TTLS = {
+        'geocode': 86400,
+        'aqi': 300,
+        'weather': 900,
+        'forecast': 1800,
+        'history': 3600,
+        'climatology': 86400,
+        'aqi_forecast': 3600,
+        'heatmap': 900,
+    }
+
+    # Shared OpenWeather call budget; each priority keeps this fraction of the buckets in reserve
+    UPSTREAM_CALLS_PER_MINUTE = 60  # Whole-account limits: every worker process gets 1/UPSTREAM_WORKER_PROCESSES
+    UPSTREAM_CALLS_PER_DAY = 30000
+    UPSTREAM_WORKER_PROCESSES = int(os.environ.get('WEB_CONCURRENCY', 1))  # Set to the server's worker count
+    UPSTREAM_PRIORITY_RESERVES = {
+        'interactive': 0.0,
+        'background': 0.2,
+        'autocomplete': 0.3,
+    }
+    UPSTREAM_STALE_TTL = 86400  # How long cached upstream responses remain usable as stale fallbacks
+
+    # Per-endpoint circuit breaker: open after N consecutive upstream failures, probe after the cooldown
+    CIRCUIT_FAILURE_THRESHOLD = 3
+    CIRCUIT_COOLDOWN = 30  # Seconds
+
+    # Response pipeline: orjson-backed JSON provider (if installed) and brotli/gzip negotiation
+    JSON_FAST_ENCODER = True
+    COMPRESS_MIN_SIZE = 1024  # Bytes; smaller payloads are sent uncompressed
+    COMPRESS_LEVEL = 6
+    COMPRESS_MIMETYPES = ['application/json', 'application/octet-stream']  # octet-stream: the binary AQI grid
+
+    # Password hashing runs in a bounded process pool; changing the method/cost rehashes on next login
+    PASSWORD_HASH_METHOD = 'scrypt'  # Werkzeug method string, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'
+    PASSWORD_HASH_WORKERS = 2  # 0 hashes inline in the request thread
+    PASSWORD_HASH_MAX_PENDING = 16
+    PASSWORD_HASH_TIMEOUT = 5  # Seconds
+
+    # Historical data and precomputed artifacts
+    CITY_DAY_CSV = 'data/city_day.csv'
+    CLIMATOLOGY_PATH = 'instance/climatology.npz'  # Built by `flask build-climatology`
+    AQI_FORECAST_PATH = 'instance/aqi_forecasts.json'  # Written by `flask forecast-aqi`
+    AQI_FORECAST_RECENT_DAYS = 30  # Days of recorded readings appended to city_day.csv for forecasting
+    EXPORT_DIR = 'instance/exports'  # Completed /api/export downloads, kept for Range (resume) requests
+    EXPORT_CHUNK_ROWS = 5000  # Source rows per streamed chunk / Parquet row group
+    EXPORT_SPOOL_TTL = 86400  # Seconds a spooled export is kept
+    EXPORT_SPOOL_MAX_FILES = 200  # Spool caps enforced before each new export is written (oldest files go first)
+    EXPORT_SPOOL_MAX_BYTES = 2 * 1024 ** 3
+
+    # Append-only recorder for upstream AQI readings (compact with `flask compact-readings`)
+    READINGS_DIR = 'instance/readings'
+    READINGS_FLUSH_INTERVAL = 5  # Seconds between background batch flushes
+    READINGS_BATCH_SIZE = 500  # Buffered readings that trigger an early flush
+
+    # AQI predictor: LRU of predictions keyed on the feature vector rounded to this many decimals
+    PREDICTION_CACHE_SIZE = 4096
+    PREDICTION_CACHE_PRECISION = 1
+
+    # On-demand request profiler (off unless a sample rate or token is set)
+    PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE', 0))  # Fraction of requests to profile
+    PROFILER_TOKEN = os.environ.get('PROFILER_TOKEN')  # Requests sending X-Profile-Token: <token> are always profiled
+    PROFILER_INTERVAL = 0.005  # Seconds between stack samples
+    PROFILER_DIR = 'instance/profiles'  # Collapsed-stack output, one file per route, process and wall/cpu
+
+    # Interpolated AQI heatmap for the map view (written by `flask build-heatmap`)
+    HEATMAP_PATH = 'instance/aqi_grid.bin'
+    HEATMAP_BBOX = (6.0, 68.0, 37.5, 97.5)  # South, west, north, east (degrees); covers India
+    HEATMAP_RESOLUTION = 0.25  # Degrees per grid cell
+    HEATMAP_POWER = 2  # Inverse-distance weighting exponent
+    HEATMAP_MAX_DISTANCE_KM = 300  # Cells farther than this from every station are left empty
+    HEATMAP_MAX_AGE = 6 * 3600  # Seconds; older readings are not interpolated
+
+    # Fingerprinted static assets (built by `flask build-assets`, served under /assets/)
+    ASSETS_DIST_DIR = 'static/dist'  # Relative to the app root
+    ASSETS_MAX_AGE = 31536000  # Seconds; hashed files never change, so they are cached for a year as immutable
+
+    # City AQI rankings: every tracked city is refreshed at background priority once per interval
+    RANKING_REFRESH_INTERVAL = 1800  # Seconds; keep tracked cities / interval within the background budget
+    RANKING_RETRY_DELAY = 30  # Seconds before cities the call budget denied are retried (they stay unstamped)
+
+    # Batched AQI lookups (favorites overview): shared worker pool and the latency bound of one batch
+    BATCH_FETCH_WORKERS = 8
+    BATCH_FETCH_TIMEOUT = 8  # Seconds; cities still pending are returned as errors
+
+    # Live dashboard updates (server-sent events)
+    LIVE_REFRESH_INTERVAL = 300  # Seconds between shared upstream refreshes per subscribed city
+    LIVE_HEARTBEAT_INTERVAL = 20  # Seconds between keep-alive comments on idle streams
+    LIVE_QUEUE_SIZE = 32  # Pending events per subscriber before it is resynced with a snapshot
+    # Open streams per process; each holds a worker thread, so run a threaded or gevent worker class
+    # (e.g. gunicorn --threads or -k gevent) and keep this well below the threads available
+    LIVE_MAX_SUBSCRIBERS = 8
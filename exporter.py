@@ -0,0 +1,168 @@
+# exporter.py
+import csv
+import glob
+import hashlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import date
+
+from climatology import POLLUTANTS
+
+# pandas and the optional pyarrow (Parquet only) are imported inside the generators so app startup stays cheap
+
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson', 'parquet': 'application/vnd.apache.parquet'}
+# Indian AQI buckets, same edges as ml_handler.get_aqi_category
+AQI_BUCKETS = ['Good', 'Satisfactory', 'Moderate', 'Poor', 'Very Poor', 'Severe']
+BUCKET_EDGES = [float('-inf'), 50, 100, 200, 300, 400, float('inf')]
+
+logger = logging.getLogger(__name__)
+
+
+def _split(value):
+    return [v.strip() for v in value.split(',') if v.strip()] if value else []
+
+
+def parse_export_query(args):
+    """Validates export filters from request args / CLI options; raises ValueError with a user-facing message."""
+    fmt = (args.get('format') or 'csv').lower()
+    if fmt not in EXPORT_FORMATS: raise ValueError(f"Unsupported format '{fmt}'; use one of {', '.join(EXPORT_FORMATS)}.")
+    if fmt == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+        raise ValueError("Parquet export needs pyarrow installed on the server.")
+    pollutants = _split(args.get('pollutants')) or [p for p in POLLUTANTS if p != 'AQI']
+    unknown = [p for p in pollutants if p not in POLLUTANTS]
+    if unknown: raise ValueError(f"Unknown pollutants: {', '.join(unknown)}.")
+    buckets = _split(args.get('buckets'))
+    unknown = [b for b in buckets if b not in AQI_BUCKETS]
+    if unknown: raise ValueError(f"Unknown AQI buckets: {', '.join(unknown)}.")
+    dates = {}
+    for key in ('start', 'end'):
+        value = args.get(key)
+        if not value: continue
+        try:
+            if len(value) != 10: raise ValueError(value) # fromisoformat also takes other ISO forms (e.g. 20190101)
+            dates[key] = date.fromisoformat(value)
+        except ValueError: raise ValueError(f"'{key}' must be a valid YYYY-MM-DD date.") from None
+    if len(dates) == 2 and dates['start'] > dates['end']: raise ValueError("'start' must not be after 'end'.")
+    return {'format': fmt, 'cities': sorted({c.lower() for c in _split(args.get('cities'))}),
+            'start': args.get('start') or None, 'end': args.get('end') or None,
+            'pollutants': [p for p in POLLUTANTS if p in pollutants and p != 'AQI'], 'buckets': sorted(buckets)}
+
+
+def export_columns(query):
+    return ['City', 'Date'] + query['pollutants'] + ['AQI', 'AQI_Bucket']
+
+
+def export_etag(csv_path, query):
+    """Identifies one export: the same query over the same source file always yields the same bytes."""
+    stat = os.stat(csv_path)
+    key = json.dumps({'source': [stat.st_mtime_ns, stat.st_size], 'query': query}, sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+
+def iter_frames(csv_path, query, chunk_rows=5000):
+    """Yields filtered DataFrame chunks; only one chunk of the source file is in memory at a time."""
+    import pandas as pd
+    columns = export_columns(query)
+    reader = pd.read_csv(csv_path, usecols=columns[:-1], dtype={'City': str, 'Date': str}, chunksize=chunk_rows)
+    for chunk in reader:
+        # ISO dates compare correctly as strings, so the date filter needs no parsing
+        if query['cities']: chunk = chunk[chunk['City'].str.lower().isin(query['cities'])]
+        if query['start']: chunk = chunk[chunk['Date'] >= query['start']]
+        if query['end']: chunk = chunk[chunk['Date'] <= query['end']]
+        # Buckets are recomputed from AQI so rows the source left unlabelled are classified consistently
+        chunk = chunk.assign(AQI_Bucket=pd.cut(chunk['AQI'], BUCKET_EDGES, labels=AQI_BUCKETS).astype(object))
+        if query['buckets']: chunk = chunk[chunk['AQI_Bucket'].isin(query['buckets'])]
+        if not chunk.empty: yield chunk[columns]
+
+
+class _Drain(io.RawIOBase):
+    """Write-only sink whose buffered bytes are handed out (and released) after every row group."""
+
+    def __init__(self):
+        self.parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.parts.append(bytes(b)); return len(b)
+
+    def take(self):
+        data = b''.join(self.parts); self.parts = []; return data
+
+
+def iter_export(csv_path, query, chunk_rows=5000):
+    """Yields the encoded export as byte chunks (CSV, NDJSON or Parquet row groups)."""
+    columns = export_columns(query)
+    frames = iter_frames(csv_path, query, chunk_rows)
+    if query['format'] == 'csv':
+        header = io.StringIO(); csv.writer(header, lineterminator='\n').writerow(columns)
+        yield header.getvalue().encode('utf-8')
+        for frame in frames: yield frame.to_csv(index=False, header=False, lineterminator='\n').encode('utf-8')
+    elif query['format'] == 'ndjson':
+        for frame in frames: yield frame.to_json(orient='records', lines=True).rstrip('\n').encode('utf-8') + b'\n'
+    else:
+        import pyarrow
+        import pyarrow.parquet as pq
+        schema = pyarrow.schema([(c, pyarrow.string() if c in ('City', 'Date', 'AQI_Bucket') else pyarrow.float64()) for c in columns])
+        sink = _Drain()
+        with pq.ParquetWriter(sink, schema) as writer:
+            for frame in frames:
+                writer.write_table(pyarrow.Table.from_pandas(frame, schema=schema, preserve_index=False))
+                yield sink.take()
+        yield sink.take()  # Footer
+
+
+def spool_path(export_dir, etag, fmt):
+    return os.path.join(export_dir, f"{etag}.{fmt}")
+
+
+def tee_to_spool(chunks, path):
+    """Passes chunks through while writing them to `path`; the file only appears once the export is complete,
+    so later Range requests (resumed downloads) can be served from disk."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    part_path = f"{path}.{uuid.uuid4().hex}.part"
+    complete = False
+    try:
+        with open(part_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+        os.replace(part_path, path)
+        complete = True
+    finally:
+        if not complete and os.path.exists(part_path): os.remove(part_path) # Client went away mid-download
+
+
+def write_spool(chunks, path):
+    """Materializes an export on disk chunk by chunk (memory stays flat)."""
+    for _ in tee_to_spool(chunks, path): pass
+    return path
+
+
+def prune_spool(export_dir, max_age, max_files=None, max_bytes=None):
+    """Deletes spooled exports (and abandoned partial files) older than max_age seconds, then the oldest
+    remaining ones until at most max_files files / max_bytes bytes are left."""
+    cutoff = time.time() - max_age
+    removed = 0
+    kept = []
+    for path in glob.glob(os.path.join(export_dir, '*')):
+        try:
+            stat = os.stat(path)
+            if stat.st_mtime < cutoff: os.remove(path); removed += 1
+            else: kept.append((stat.st_mtime, stat.st_size, path))
+        except OSError: continue
+    kept.sort(reverse=True) # Newest first; anything past the limits goes
+    count = total = 0
+    for _, size, path in kept:
+        count += 1; total += size
+        if (max_files is not None and count > max_files) or (max_bytes is not None and total > max_bytes):
+            try: os.remove(path); removed += 1
+            except OSError: continue
+    if removed: logger.info(f"Pruned {removed} spooled exports from {export_dir}.")
+    return removed
@@ -1,5 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_caching import Cache
+from response_pipeline import ResponseCompressor
+from password_pool import PasswordHasher
+from recorder import ReadingRecorder
+from profiler import RequestProfiler
+from assets import AssetPipeline
 
 db = SQLAlchemy()
-cache = Cache()
\ No newline at end of file
+cache = Cache()
+compressor = ResponseCompressor()
+password_hasher = PasswordHasher()
+recorder = ReadingRecorder()
+profiler = RequestProfiler()
+assets = AssetPipeline()
\ No newline at end of file
@@ -0,0 +1,116 @@
+# forecaster.py
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# numpy/pandas are imported inside the job so the web process never pays for them
+
+HORIZONS = [1, 2]  # Days ahead (next 24h / 48h)
+LAGS = [1, 2, 3, 7]
+MAX_GAP_FILL = 3  # Days a missing AQI value may be carried forward; also the oldest usable last observation
+FEATURES = ['bias'] + [f'lag{l}' for l in LAGS] + ['mean7', 'doy_sin', 'doy_cos']
+
+logger = logging.getLogger(__name__)
+
+_store = {'mtime': None, 'data': None}
+_store_lock = threading.Lock()
+
+
+def _daily_series(csv_path, recorded_rows):
+    """Returns a date × city AQI matrix from city_day.csv plus daily means of recorded readings."""
+    import pandas as pd
+    df = pd.read_csv(csv_path, usecols=['City', 'Date', 'AQI'], parse_dates=['Date']).dropna(subset=['AQI'])
+    frames = [df]
+    recorded = pd.DataFrame(recorded_rows, columns=['city', 'dt', 'aqi']).dropna()
+    if not recorded.empty:
+        recorded = recorded[recorded['city'] != '']
+        recorded['Date'] = pd.to_datetime(recorded['dt'], unit='s').dt.normalize()
+        frames.append(recorded.groupby(['city', 'Date'], as_index=False)['aqi'].mean().rename(columns={'city': 'City', 'aqi': 'AQI'}))
+    combined = pd.concat(frames, ignore_index=True)
+    combined['City'] = combined['City'].str.strip().str.title()
+    series = combined.groupby(['Date', 'City'])['AQI'].mean().unstack('City')
+    series = series.reindex(pd.date_range(series.index.min(), series.index.max(), freq='D'))
+    return series.ffill(limit=MAX_GAP_FILL)
+
+
+def _feature_cube(series):
+    """Builds the (dates, cities, features) lag-feature array for every city in one vectorized pass."""
+    import numpy as np
+    values = series.to_numpy(dtype=np.float64)
+    n_dates, n_cities = values.shape
+
+    def shifted(k):
+        out = np.full_like(values, np.nan); out[k:] = values[:-k]; return out
+
+    lags = [values if l == 1 else shifted(l - 1) for l in LAGS]  # Row t holds the features known at the end of day t
+    mean7 = series.rolling(7, min_periods=4).mean().to_numpy(dtype=np.float64)
+    doy = series.index.dayofyear.to_numpy()[:, None] + np.zeros((1, n_cities))
+    cube = np.stack([np.ones_like(values)] + lags + [mean7, np.sin(2 * np.pi * doy / 365.25), np.cos(2 * np.pi * doy / 365.25)], axis=-1)
+    targets = np.stack([np.vstack([values[h:], np.full((h, n_cities), np.nan)]) for h in HORIZONS], axis=-1)
+    return cube, targets
+
+
+def run_forecast_job(csv_path, out_path, recorded_rows=(), as_of=None):
+    """Fits one linear next-day model per horizon on all cities and writes the latest forecasts as JSON.
+
+    Only cities whose latest complete feature row is at most MAX_GAP_FILL days before `as_of` (default:
+    today, UTC) are forecast; the others have no recent readings and would get forecasts for past dates.
+    """
+    import numpy as np
+    from ml_handler import get_aqi_category
+
+    started = time.perf_counter()
+    series = _daily_series(csv_path, recorded_rows)
+    cube, targets = _feature_cube(series)
+
+    # Fit: ordinary least squares over every complete (date, city) row, both horizons at once
+    X = cube.reshape(-1, len(FEATURES)); Y = targets.reshape(-1, len(HORIZONS))
+    train = ~np.isnan(X).any(axis=1) & ~np.isnan(Y).any(axis=1)
+    weights, *_ = np.linalg.lstsq(X[train], Y[train], rcond=None)
+    residuals = Y[train] - X[train] @ weights
+    mae = np.abs(residuals).mean(axis=0)
+
+    # Inference: the latest complete feature row per city, scored in one batched matrix product
+    valid = ~np.isnan(cube).any(axis=-1)
+    has_row = valid.any(axis=0)
+    last_idx = len(series) - 1 - np.argmax(valid[::-1], axis=0)
+    latest = cube[last_idx, np.arange(cube.shape[1])]
+    predictions = np.clip(latest @ weights, 0, None)
+
+    today = np.datetime64(as_of or datetime.now(timezone.utc).date(), 'D')
+    forecasts = {}; outdated = 0
+    for c, city in enumerate(series.columns):
+        if not has_row[c]: continue
+        based_on = series.index[last_idx[c]]
+        if today - np.datetime64(based_on.date(), 'D') > np.timedelta64(MAX_GAP_FILL, 'D'): outdated += 1; continue
+        forecasts[city.lower()] = {
+            'city': city, 'based_on': based_on.strftime('%Y-%m-%d'),
+            'forecast': [{'horizon_hours': h * 24, 'date': (based_on + np.timedelta64(h, 'D')).strftime('%Y-%m-%d'),
+                          'aqi': round(float(predictions[c, i])), 'category': get_aqi_category(float(predictions[c, i]))['category']}
+                         for i, h in enumerate(HORIZONS)],
+        }
+    store = {'generated_at': datetime.now(timezone.utc).isoformat(timespec='seconds'), 'features': FEATURES,
+             'training_rows': int(train.sum()), 'mae': {f'{h * 24}h': round(float(m), 1) for h, m in zip(HORIZONS, mae)},
+             'skipped_outdated': outdated, 'cities': forecasts}
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'w') as f: json.dump(store, f)
+    os.replace(tmp_path, out_path)
+    logger.info(f"Forecasts for {len(forecasts)} cities written to {out_path} in {time.perf_counter() - started:.2f} s.")
+    return store
+
+
+def get_city_forecast(path, city):
+    """Constant-time lookup in the forecast store; reloads the file only when the job has rewritten it."""
+    try: mtime = os.stat(path).st_mtime
+    except FileNotFoundError: return None
+    if _store['mtime'] != mtime:
+        with _store_lock:
+            if _store['mtime'] != mtime:
+                with open(path) as f: _store['data'] = json.load(f)
+                _store['mtime'] = mtime
+    entry = _store['data']['cities'].get(city.strip().lower())
+    if entry is None: return None
+    return {**entry, 'generated_at': _store['data']['generated_at']}
@@ -0,0 +1,77 @@
+# heatmap.py
+import logging
+import os
+import struct
+import time
+
+# numpy is imported inside the build functions; serving the grid only reads bytes from disk
+
+GRID_MAGIC = b'AQIG'
+# magic, width, height, south, west, lat step, lon step (little endian); uint16 AQI cells follow, north row first
+GRID_HEADER = struct.Struct('<4sHHffff')
+NODATA = 65535
+EARTH_RADIUS_KM = 6371.0
+
+logger = logging.getLogger(__name__)
+
+
+def latest_by_location(readings):
+    """Keeps the newest reading with a numeric AQI per (rounded) location."""
+    latest = {}
+    for row in readings:
+        if row.get('aqi') is None: continue
+        key = (round(row['lat'], 2), round(row['lon'], 2))
+        if key not in latest or row['dt'] > latest[key]['dt']: latest[key] = row
+    return list(latest.values())
+
+
+def interpolate_grid(lats, lons, values, bbox, resolution, power=2.0, max_distance_km=300.0, chunk_rows=32):
+    """Inverse-distance-weighted AQI on a regular lat/lon grid covering bbox = (south, west, north, east).
+
+    Great-circle distances between every cell and every station are computed as one array operation per
+    block of grid rows. Cells farther than `max_distance_km` from all stations are NaN.
+    """
+    import numpy as np
+    south, west, north, east = bbox
+    grid_lats = np.arange(north, south - 1e-9, -resolution)  # North row first, like an image
+    grid_lons = np.arange(west, east + 1e-9, resolution)
+    p_lat = np.radians(np.asarray(lats, dtype=np.float64)); p_lon = np.radians(np.asarray(lons, dtype=np.float64))
+    vals = np.asarray(values, dtype=np.float64)
+    out = np.full((len(grid_lats), len(grid_lons)), np.nan)
+    c_lon = np.radians(grid_lons)[None, :, None]
+    for r0 in range(0, len(grid_lats), chunk_rows):
+        c_lat = np.radians(grid_lats[r0:r0 + chunk_rows])[:, None, None]
+        # Haversine distance, shape (rows, cols, stations)
+        a = np.sin((p_lat - c_lat) / 2) ** 2 + np.cos(c_lat) * np.cos(p_lat) * np.sin((p_lon - c_lon) / 2) ** 2
+        dist = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+        weights = 1.0 / np.maximum(dist, 1e-3) ** power
+        weights[dist > max_distance_km] = 0.0
+        total = weights.sum(axis=-1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            block = (weights * vals).sum(axis=-1) / total
+        block[total == 0] = np.nan
+        out[r0:r0 + chunk_rows] = block
+    return out, (float(south), float(west), resolution, resolution)
+
+
+def encode_grid(grid, origin):
+    """Packs a grid into the compact binary format served by /api/aqi_grid."""
+    import numpy as np
+    south, west, dlat, dlon = origin
+    cells = np.where(np.isnan(grid), NODATA, np.clip(np.rint(grid), 0, NODATA - 1)).astype('<u2')
+    return GRID_HEADER.pack(GRID_MAGIC, grid.shape[1], grid.shape[0], south, west, dlat, dlon) + cells.tobytes()
+
+
+def build_heatmap(readings, out_path, bbox, resolution, power=2.0, max_distance_km=300.0):
+    """Interpolates the latest reading of every known location and writes the binary grid atomically."""
+    started = time.perf_counter()
+    points = latest_by_location(readings)
+    if not points: raise ValueError("No recorded AQI readings to interpolate.")
+    grid, origin = interpolate_grid([p['lat'] for p in points], [p['lon'] for p in points], [p['aqi'] for p in points],
+                                    bbox, resolution, power, max_distance_km)
+    payload = encode_grid(grid, origin)
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'wb') as f: f.write(payload)
+    os.replace(tmp_path, out_path)
+    logger.info(f"AQI grid {grid.shape} from {len(points)} stations written to {out_path} in {time.perf_counter() - started:.2f} s.")
+    return {'stations': len(points), 'width': grid.shape[1], 'height': grid.shape[0], 'bytes': len(payload)}
@@ -1,25 +1,61 @@
 # ml_handler.py
+import os
 import pickle
-import pandas as pd
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import logging
+from flask import current_app
 
 # Set up logger basic config if not already configured elsewhere
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(levelname)s:%(name)s:%(message)s')
 
 MODEL_FEATURES = ['PM2.5', 'PM10', 'NO', 'NO2', 'NOx', 'NH3', 'CO', 'SO2','O3', 'Benzene', 'Toluene', 'Xylene']
+MODEL_PATH = 'ml_models/random_forest_model.pkl'
 
+# Loaded on first use: unpickling pulls in scikit-learn, which would otherwise slow every worker's boot
 AQI_PREDICTOR_MODEL = None
-
-try:
-    model_path = 'ml_models/random_forest_model.pkl'
-    with open(model_path, 'rb') as f:
-        AQI_PREDICTOR_MODEL = pickle.load(f)
-    logging.info(f"✅ AQI Predictor Model ({model_path}) loaded successfully.")
-except FileNotFoundError:
-    logging.error(f"❌ Error: {model_path} not found. AQI predictor will not work.")
-except Exception as e:
-    logging.error(f"❌ Error loading {model_path}: {e}", exc_info=True)
+MODEL_VERSION = None # "<mtime>-<size>" of the loaded pickle; a new file on disk is picked up automatically
+_model_lock = threading.Lock()
+
+# Memoized predictions keyed on (model version, quantized feature vector)
+_prediction_cache = OrderedDict()
+_prediction_stats = {'hits': 0, 'misses': 0}
+_prediction_lock = threading.Lock()
+
+
+def _model_file_version():
+    try: stat = os.stat(MODEL_PATH)
+    except OSError: return None
+    return f"{int(stat.st_mtime)}-{stat.st_size}"
+
+
+def get_predictor_model():
+    """Returns the RandomForest AQI model, loading it on first use or when the file changes (None if unavailable)."""
+    global AQI_PREDICTOR_MODEL, MODEL_VERSION
+    version = _model_file_version() or 'missing'
+    if version == MODEL_VERSION: return AQI_PREDICTOR_MODEL
+    with _model_lock:
+        if version == MODEL_VERSION: return AQI_PREDICTOR_MODEL
+        if version == 'missing':
+            logging.error(f"❌ Error: {MODEL_PATH} not found. AQI predictor will not work.")
+        else:
+            try:
+                with open(MODEL_PATH, 'rb') as f:
+                    AQI_PREDICTOR_MODEL = pickle.load(f)
+                logging.info(f"✅ AQI Predictor Model ({MODEL_PATH}, version {version}) loaded successfully.")
+            except Exception as e:
+                logging.error(f"❌ Error loading {MODEL_PATH}: {e}", exc_info=True)
+        MODEL_VERSION = version
+        with _prediction_lock: _prediction_cache.clear() # Old predictions belong to the old model
+    return AQI_PREDICTOR_MODEL
+
+
+def prediction_cache_stats():
+    with _prediction_lock:
+        lookups = _prediction_stats['hits'] + _prediction_stats['misses']
+        return {'size': len(_prediction_cache), 'max_size': current_app.config.get('PREDICTION_CACHE_SIZE', 4096), **_prediction_stats,
+                'hit_ratio': round(_prediction_stats['hits'] / lookups, 4) if lookups else None, 'model_version': MODEL_VERSION}
 
 
 def get_aqi_category(aqi):
@@ -42,23 +78,43 @@ def get_aqi_category(aqi):
 
 
 def predict_current_aqi(data):
-    """ Predicts AQI using the loaded Random Forest model. """
-    if not AQI_PREDICTOR_MODEL: logging.error("AQI prediction failed: Model not loaded."); return None
+    """ Predicts AQI using the loaded Random Forest model.
+
+    Inputs are rounded to PREDICTION_CACHE_PRECISION decimals and served from an LRU cache when
+    the same quantized vector was already scored by the current model version.
+    """
+    model = get_predictor_model()
+    if not model: logging.error("AQI prediction failed: Model not loaded."); return None
+    precision = current_app.config.get('PREDICTION_CACHE_PRECISION', 1)
+    max_size = current_app.config.get('PREDICTION_CACHE_SIZE', 4096)
     try:
         input_values = {}
         missing_features, invalid_features = [], []
         for feature in MODEL_FEATURES:
             if feature not in data: missing_features.append(feature); continue
-            try: input_values[feature] = [float(data[feature])]
+            try: input_values[feature] = round(float(data[feature]), precision)
             except (ValueError, TypeError): invalid_features.append(feature)
         if missing_features: logging.error(f"Prediction failed: Missing features: {missing_features}"); return None
         if invalid_features: logging.error(f"Prediction failed: Invalid features: {invalid_features}"); return None
-        input_df = pd.DataFrame(input_values, columns=MODEL_FEATURES)
+
+        cache_key = (MODEL_VERSION,) + tuple(input_values[f] for f in MODEL_FEATURES)
+        with _prediction_lock:
+            if cache_key in _prediction_cache:
+                _prediction_cache.move_to_end(cache_key); _prediction_stats['hits'] += 1
+                logging.debug(f"Prediction cache hit: {_prediction_cache[cache_key]}")
+                return _prediction_cache[cache_key]
+            _prediction_stats['misses'] += 1
+
+        import pandas as pd # Deferred with the model so app startup does not pay for it
+        input_df = pd.DataFrame({f: [v] for f, v in input_values.items()}, columns=MODEL_FEATURES)
         logging.debug(f"Input DataFrame for prediction:\n{input_df}")
-        prediction = AQI_PREDICTOR_MODEL.predict(input_df)
+        prediction = model.predict(input_df)
         logging.info(f"Raw prediction: {prediction}")
         predicted_aqi = round(float(prediction[0]), 2)
         logging.info(f"Predicted AQI: {predicted_aqi}")
+        with _prediction_lock:
+            _prediction_cache[cache_key] = predicted_aqi
+            while len(_prediction_cache) > max_size: _prediction_cache.popitem(last=False)
         return predicted_aqi
     except Exception as e: logging.error(f"!!! Unexpected Error during AQI prediction: {e}", exc_info=True); return None
 
@@ -1,19 +1,24 @@
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
-from extensions import db
+from extensions import db, password_hasher
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     full_name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
+    password_hash = db.Column(db.String(256), nullable=False)
     preferred_city = db.Column(db.String(50), default='Delhi')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+    def rehash_password_if_needed(self, password):
+        # Call only after a successful check_password; returns True if the hash changed (caller commits)
+        if not password_hasher.needs_rehash(self.password_hash): return False
+        self.set_password(password)
+        return True
 
 class Tip(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,92 @@
+# password_pool.py
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHashingBusy(RuntimeError):
+    """Raised when the hashing pool is saturated or a hash does not finish within its timeout."""
+
+
+def _hash_prefix(method):
+    # Werkzeug hashes look like "<method:params>$<salt>$<hash>"; the prefix pins the KDF and its cost
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+class PasswordHasher:
+    """Runs Werkzeug's deliberately slow KDF in a bounded process pool instead of the request thread.
+
+    At most PASSWORD_HASH_MAX_PENDING hashes may be queued or running; callers beyond that (or whose
+    hash exceeds PASSWORD_HASH_TIMEOUT seconds) get PasswordHashingBusy. PASSWORD_HASH_WORKERS = 0
+    hashes inline, which is handy for tests and the dev server. If a pool child dies (OOM kill,
+    segfault), the broken pool is dropped, the caller gets PasswordHashingBusy and the next call
+    starts a fresh pool.
+    """
+
+    def __init__(self):
+        self.method = 'scrypt'
+        self.workers = 2
+        self.timeout = 5.0
+        self._slots = threading.BoundedSemaphore(16)
+        self._executor = None
+        self._prefix = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self._slots = threading.BoundedSemaphore(app.config.get('PASSWORD_HASH_MAX_PENDING', 16))
+        app.extensions['password_hasher'] = self
+
+    def _run(self, fn, *args):
+        if not self.workers: return fn(*args)
+        if not self._slots.acquire(timeout=self.timeout): raise PasswordHashingBusy("Password hashing queue is full.")
+        try:
+            with self._lock:
+                if self._executor is None:
+                    # 'spawn' keeps children free of locks inherited from the threaded parent
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+                executor = self._executor
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release(); self._discard(executor)
+            raise PasswordHashingBusy("Password hashing pool crashed; it is being restarted.")
+        except BaseException:
+            self._slots.release(); raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise PasswordHashingBusy("Password hashing timed out.")
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise PasswordHashingBusy("Password hashing pool crashed; it is being restarted.")
+
+    def _discard(self, executor):
+        """Drops a broken pool so the next call creates a new one (unless another thread already did)."""
+        with self._lock:
+            if self._executor is not executor: return
+            logger.error("Password hashing pool broke (a worker process died); starting a new one on the next call.")
+            self._executor.shutdown(wait=False, cancel_futures=True); self._executor = None
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if a stored hash was made with a different method or cost than the configured one."""
+        if self._prefix is None: self._prefix = self._run(_hash_prefix, self.method)
+        return pwhash.split('$', 1)[0] != self._prefix
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None: self._executor.shutdown(wait=False, cancel_futures=True); self._executor = None
@@ -0,0 +1,121 @@
+# profiler.py
+import hmac
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+
+def _collapse(frame):
+    """Renders a frame chain as a collapsed stack ("root;...;leaf") for flamegraph tools."""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(parts))
+
+
+class RequestProfiler:
+    """Samples the stacks of selected requests and aggregates them per route.
+
+    A request is profiled when it carries `X-Profile-Token: <PROFILER_TOKEN>` or wins the
+    PROFILER_SAMPLE_RATE coin flip. While any profiled request is running, one sampler thread
+    records its stack every PROFILER_INTERVAL seconds (wall samples) and, when the request thread
+    used CPU since the previous tick, a CPU sample too. Aggregates are written as collapsed-stack
+    files (`<route>.<pid>.wall.folded` / `.cpu.folded`) under PROFILER_DIR, ready for flamegraph.pl
+    or speedscope. With neither option configured no hooks are installed at all.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._active = {}  # thread ident -> profile dict of an in-flight request
+        self._routes = defaultdict(lambda: {'requests': 0, 'wall_ms': 0.0, 'wall': Counter(), 'cpu': Counter()})
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self.sample_rate = app.config.get('PROFILER_SAMPLE_RATE', 0.0)
+        self.token = app.config.get('PROFILER_TOKEN')
+        self.interval = app.config.get('PROFILER_INTERVAL', 0.005)
+        self.out_dir = app.config.get('PROFILER_DIR', 'instance/profiles')
+        if not self.sample_rate and not self.token: return
+        self.enabled = True
+        app.before_request(self._start)
+        app.teardown_request(self._stop)
+        app.extensions['profiler'] = self
+        logger.info(f"Request profiler enabled (sample rate {self.sample_rate}, token {'set' if self.token else 'unset'}).")
+
+    def _selected(self):
+        header = request.headers.get('X-Profile-Token')
+        if self.token and header and hmac.compare_digest(header, self.token): return True
+        return bool(self.sample_rate) and random.random() < self.sample_rate
+
+    def _start(self):
+        if not self._selected(): return
+        ident = threading.get_ident()
+        try: clock = time.pthread_getcpuclockid(ident)
+        except (AttributeError, OSError): clock = None # CPU samples need per-thread clocks (Linux/macOS)
+        profile = {'route': request.endpoint or request.path, 'started': time.perf_counter(), 'clock': clock,
+                   'last_cpu': time.clock_gettime(clock) if clock is not None else 0.0, 'wall': Counter(), 'cpu': Counter()}
+        g._profile = profile
+        with self._lock:
+            self._active[ident] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_loop, name='request-profiler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock: active = list(self._active.items())
+            if not active:
+                self._wakeup.wait(); self._wakeup.clear(); continue
+            frames = sys._current_frames()
+            for ident, profile in active:
+                frame = frames.get(ident)
+                if frame is None or ident == own: continue
+                stack = _collapse(frame)
+                profile['wall'][stack] += 1
+                if profile['clock'] is not None:
+                    try: cpu = time.clock_gettime(profile['clock'])
+                    except OSError: continue # Thread finished between snapshot and read
+                    if cpu - profile['last_cpu'] >= self.interval / 2: profile['cpu'][stack] += 1
+                    profile['last_cpu'] = cpu
+            del frames
+            time.sleep(self.interval)
+
+    def _stop(self, exc=None):
+        profile = g.pop('_profile', None)
+        if profile is None: return
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+            route = self._routes[profile['route']]
+            route['requests'] += 1; route['wall_ms'] += (time.perf_counter() - profile['started']) * 1000
+            route['wall'].update(profile['wall']); route['cpu'].update(profile['cpu'])
+            snapshot = {kind: dict(route[kind]) for kind in ('wall', 'cpu')}
+        try: self._write(profile['route'], snapshot)
+        except OSError as e: logger.error(f"Could not write profile for {profile['route']}: {e}")
+
+    def _write(self, route, snapshot):
+        os.makedirs(self.out_dir, exist_ok=True)
+        name = ''.join(ch if ch.isalnum() or ch in '._-' else '_' for ch in route)
+        for kind, stacks in snapshot.items():
+            path = os.path.join(self.out_dir, f"{name}.{os.getpid()}.{kind}.folded")
+            with open(path + '.tmp', 'w') as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+            os.replace(path + '.tmp', path)
+
+    def summary(self):
+        with self._lock:
+            return {route: {'requests': r['requests'], 'avg_wall_ms': round(r['wall_ms'] / r['requests'], 1),
+                            'wall_samples': sum(r['wall'].values()), 'cpu_samples': sum(r['cpu'].values())}
+                    for route, r in self._routes.items() if r['requests']}
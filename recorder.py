@@ -0,0 +1,164 @@
+# recorder.py
+import atexit
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+
+COMPONENTS = ['co', 'no', 'no2', 'o3', 'so2', 'pm2_5', 'pm10', 'nh3']
+COLUMNS = ['city', 'lat', 'lon', 'dt', 'aqi'] + COMPONENTS
+
+logger = logging.getLogger(__name__)
+
+
+def _location_key(lat, lon):
+    return (round(float(lat), 2), round(float(lon), 2))
+
+
+def _day(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+class ReadingRecorder:
+    """Append-only store for every upstream AQI reading.
+
+    `record()` only appends to an in-memory buffer; a daemon thread flushes batches to hourly NDJSON
+    segments under `<READINGS_DIR>/log/` (one file per process and hour, so writers never share a file).
+    `flask compact-readings` folds closed segments into columnar daily partitions in
+    `<READINGS_DIR>/daily/<YYYY-MM-DD>.npz`. A small per-location index of the last day's readings is
+    kept in memory so history requests can be served without another upstream call.
+    """
+
+    def __init__(self):
+        self.root = 'instance/readings'
+        self.flush_interval = 5.0
+        self.batch_size = 500
+        self.recent_window = 26 * 3600
+        self._buffer = deque()
+        self._recent = defaultdict(dict)  # location key -> {dt: aqi}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self.root = app.config.get('READINGS_DIR', self.root)
+        self.flush_interval = app.config.get('READINGS_FLUSH_INTERVAL', self.flush_interval)
+        self.batch_size = app.config.get('READINGS_BATCH_SIZE', self.batch_size)
+        app.extensions['recorder'] = self
+        atexit.register(self.flush)
+
+    # --- Write path ---
+    def record(self, city, lat, lon, dt, components, aqi):
+        """Queues one reading; never touches the disk on the caller's thread."""
+        if dt is None or lat is None or lon is None: return
+        key = _location_key(lat, lon)
+        aqi = aqi if isinstance(aqi, (int, float)) else None
+        with self._lock:
+            readings = self._recent[key]
+            if dt in readings: return # Already seen (cached response or overlapping history window)
+            readings[dt] = aqi
+            if len(readings) > 64:
+                cutoff = time.time() - self.recent_window
+                for old in [t for t in readings if t < cutoff]: del readings[old]
+            row = {'city': city, 'lat': float(lat), 'lon': float(lon), 'dt': int(dt), 'aqi': aqi}
+            row.update({c: components.get(c) for c in COMPONENTS})
+            self._buffer.append(row)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='reading-recorder', daemon=True)
+                self._thread.start()
+            if len(self._buffer) >= self.batch_size: self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(timeout=self.flush_interval); self._wakeup.clear()
+            try: self.flush()
+            except Exception as e: logger.exception(f"Flushing AQI readings failed: {e}")
+
+    def flush(self):
+        with self._lock:
+            rows = list(self._buffer); self._buffer.clear()
+        if not rows: return 0
+        log_dir = os.path.join(self.root, 'log'); os.makedirs(log_dir, exist_ok=True)
+        segment = os.path.join(log_dir, f"{datetime.now(timezone.utc).strftime('%Y%m%d%H')}-{os.getpid()}.ndjson")
+        with open(segment, 'a') as f:
+            f.write(''.join(json.dumps(row) + '\n' for row in rows))
+        logger.debug(f"Flushed {len(rows)} AQI readings to {segment}")
+        return len(rows)
+
+    # --- Read path ---
+    def recent_hourly(self, lat, lon, since):
+        """Returns [(hour_ts, aqi)] for readings at a location since `since`, keeping the latest per hour."""
+        with self._lock:
+            readings = dict(self._recent.get(_location_key(lat, lon), {}))
+        hourly = {}
+        for dt in sorted(readings):
+            if dt >= since and readings[dt] is not None: hourly[dt - dt % 3600] = readings[dt]
+        return sorted(hourly.items())
+
+    def _segments(self, closed_only=False):
+        current_hour = datetime.now(timezone.utc).strftime('%Y%m%d%H')
+        for path in sorted(glob.glob(os.path.join(self.root, 'log', '*.ndjson'))):
+            if closed_only and os.path.basename(path).split('-', 1)[0] >= current_hour: continue
+            yield path
+
+    def iter_readings(self, start=None, end=None):
+        """Yields stored readings (dicts with COLUMNS) with start <= dt < end, partitions first, then the log."""
+        import numpy as np
+        first_day = _day(start) if start is not None else None
+        last_day = _day(end) if end is not None else None
+        for path in sorted(glob.glob(os.path.join(self.root, 'daily', '*.npz'))):
+            day = os.path.basename(path)[:-4]
+            if (first_day and day < first_day) or (last_day and day > last_day): continue
+            with np.load(path) as part:
+                columns = {c: part[c] for c in COLUMNS}
+            for i in range(len(columns['dt'])):
+                dt = int(columns['dt'][i])
+                if (start is not None and dt < start) or (end is not None and dt >= end): continue
+                row = {c: columns[c][i].item() for c in COLUMNS}
+                yield {k: (None if isinstance(v, float) and math.isnan(v) else v) for k, v in row.items()}
+        for path in self._segments():
+            with open(path) as f:
+                for line in f:
+                    try: row = json.loads(line)
+                    except ValueError: continue # Torn final line from a crashed writer
+                    if (start is None or row['dt'] >= start) and (end is None or row['dt'] < end): yield row
+
+    # --- Compaction ---
+    def compact(self):
+        """Folds closed log segments into daily columnar partitions; returns (segments, rows) processed."""
+        import numpy as np
+        segments = list(self._segments(closed_only=True))
+        by_day = defaultdict(list)
+        for path in segments:
+            with open(path) as f:
+                for line in f:
+                    try: row = json.loads(line)
+                    except ValueError: continue
+                    by_day[_day(row['dt'])].append(row)
+        daily_dir = os.path.join(self.root, 'daily'); os.makedirs(daily_dir, exist_ok=True)
+        total = 0
+        for day, rows in by_day.items():
+            path = os.path.join(daily_dir, f"{day}.npz")
+            columns = {'city': np.array([r['city'] or '' for r in rows], dtype=str),
+                       'dt': np.array([r['dt'] for r in rows], dtype=np.int64)}
+            for c in ['lat', 'lon', 'aqi'] + COMPONENTS:
+                columns[c] = np.array([np.nan if r.get(c) is None else r[c] for r in rows], dtype=np.float64)
+            if os.path.exists(path):
+                with np.load(path) as existing:
+                    columns = {c: np.concatenate([existing[c], columns[c]]) for c in COLUMNS}
+            # Keep one row per (location, dt), sorted by time; re-running after a crash is harmless
+            keys = np.stack([np.round(columns['lat'], 2), np.round(columns['lon'], 2), columns['dt'].astype(np.float64)], axis=1)
+            _, unique_idx = np.unique(keys, axis=0, return_index=True)
+            order = unique_idx[np.argsort(columns['dt'][unique_idx], kind='stable')]
+            columns = {c: v[order] for c, v in columns.items()}
+            tmp_path = os.path.join(daily_dir, f".{day}.tmp.npz")
+            np.savez(tmp_path, **columns); os.replace(tmp_path, path)
+            total += len(rows)
+        for path in segments: os.remove(path)
+        logger.info(f"Compacted {len(segments)} reading segments ({total} rows) into {len(by_day)} daily partitions.")
+        return len(segments), total
@@ -0,0 +1,85 @@
+# response_pipeline.py
+import gzip
+import logging
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+# Optional accelerators: the pipeline falls back to stdlib json / gzip-only without them
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that serializes with orjson when it is installed.
+
+    The compact `separators` and `indent=2` that `jsonify` passes map onto orjson's default output and
+    OPT_INDENT_2, and `sort_keys` onto OPT_SORT_KEYS. Any other stdlib-only option, and payloads
+    orjson rejects, fall back to Flask's default encoder, so output stays valid either way.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None: return super().dumps(obj, **kwargs)
+        options = dict(kwargs)
+        separators = options.pop('separators', (',', ':'))
+        indent = options.pop('indent', None)
+        if options or tuple(separators) != (',', ':') or indent not in (None, 2):
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if indent: option |= orjson.OPT_INDENT_2
+        if self.sort_keys: option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+
+def compress_bytes(data, encoding, level):
+    """Compresses a payload with the given content-coding ('br' or 'gzip')."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=min(level, 9))
+
+
+class ResponseCompressor:
+    """Negotiates brotli/gzip for buffered responses above a size threshold."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.config.setdefault('COMPRESS_MIMETYPES', ['application/json'])
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.level = app.config['COMPRESS_LEVEL']
+        self.mimetypes = set(app.config['COMPRESS_MIMETYPES'])
+        self.encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+        app.after_request(self.after_request)
+
+    def after_request(self, response):
+        if response.mimetype not in self.mimetypes: return response
+        response.vary.add('Accept-Encoding')
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers):
+            return response
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if not encoding: return response
+        data = response.get_data()
+        if len(data) < self.min_size: return response
+
+        response.set_data(compress_bytes(data, encoding, self.level))
+        response.headers['Content-Encoding'] = encoding
+        # Validators stay meaningful across encodings as weak ETags (If-None-Match uses weak comparison)
+        etag, weak = response.get_etag()
+        if etag and not weak: response.set_etag(etag, weak=True)
+        logger.debug(f"Compressed {request.path} with {encoding}: {len(data)} -> {response.content_length} bytes")
+        return response
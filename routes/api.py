@@ -1,13 +1,23 @@
 # routes/api.py
 
-from flask import Blueprint, request, jsonify, session, url_for, current_app
+from flask import Blueprint, request, jsonify, session, url_for, current_app, Response, send_file
 from models import db, User, Favorite, Tip
 from .utils import (
     fetch_aqi, fetch_weather, fetch_forecast, fetch_historical_aqi,
-    get_relevant_tips, get_coords_from_city
+    get_relevant_tips, get_coords_from_city, http_cached, governor, breaker_metrics, _upstream_json, fetch_aqi_batch, _mark_degraded
 )
-from ml_handler import predict_current_aqi, get_aqi_category, calculate_all_subindices
+from .live import live_hub, sse_stream
+from .rankings import city_rankings, REGIONS
+from password_pool import PasswordHashingBusy
+from climatology import city_climatology
+from forecaster import get_city_forecast
+from exporter import (
+    EXPORT_FORMATS, parse_export_query, export_etag, iter_export, spool_path, tee_to_spool, write_spool, prune_spool
+)
+from ml_handler import predict_current_aqi, get_aqi_category, calculate_all_subindices, get_predictor_model, prediction_cache_stats
 import logging
+import os
+from datetime import datetime, timezone
 import requests # Necessary for the autocomplete and reverse geocoding
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
@@ -38,6 +48,10 @@ def api_signup():
         db.session.commit()
         logger.info(f"New user registered: {email}")
         return jsonify({'success': True, 'message': 'Registration successful! Please log in.', 'redirect': url_for('auth.login')})
+    except PasswordHashingBusy as e:
+        db.session.rollback()
+        logger.warning(f"Signup deferred for {email}: {e}")
+        return jsonify({'success': False, 'error': 'Server is busy, please try again shortly.'}), 503
     except Exception as e:
         db.session.rollback()
         logger.error(f"Signup Error: {e}", exc_info=True)
@@ -54,7 +68,15 @@ def api_login():
         return jsonify({'success': False, 'error': 'Email and password are required.'}), 400
 
     user = User.query.filter_by(email=email).first()
-    if user and user.check_password(password):
+    try:
+        authenticated = bool(user and user.check_password(password))
+        if authenticated and user.rehash_password_if_needed(password):
+            db.session.commit(); logger.info(f"Rehashed password for '{user.email}' with current parameters.")
+    except PasswordHashingBusy as e:
+        db.session.rollback()
+        logger.warning(f"Login deferred for {email}: {e}")
+        return jsonify({'success': False, 'error': 'Server is busy, please try again shortly.'}), 503
+    if authenticated:
         session['user_id'] = user.id
         session['full_name'] = user.full_name
         session['city'] = user.preferred_city
@@ -66,6 +88,7 @@ def api_login():
 
 # --- DASHBOARD DATA ROUTES ---
 @api_bp.route('/aqi/<city>')
+@http_cached('aqi', last_modified=True)
 def get_aqi(city):
     # Fetches real-time AQI data for a given city
     coords = get_coords_from_city(city)
@@ -74,6 +97,7 @@ def get_aqi(city):
     return jsonify(data)
 
 @api_bp.route('/weather/<city>')
+@http_cached('weather', last_modified=True)
 def get_weather(city):
     # Fetches real-time weather data for a given city
     coords = get_coords_from_city(city)
@@ -82,6 +106,7 @@ def get_weather(city):
     return jsonify(data)
 
 @api_bp.route('/forecast/<city>')
+@http_cached('forecast')
 def get_forecast(city):
     # Fetches 5-day weather forecast (daily summary and hourly slice)
     coords = get_coords_from_city(city)
@@ -92,13 +117,66 @@ def get_forecast(city):
     return jsonify({'daily': daily_summary, 'hourly': hourly_slice})
 
 @api_bp.route('/historical/<city>')
+@http_cached('history')
 def get_historical(city):
     # Fetches 24-hour historical AQI data
     coords = get_coords_from_city(city)
     if 'error' in coords: return jsonify({'error': coords['error']}), 404
-    data = fetch_historical_aqi(coords['lat'], coords['lon'])
+    data = fetch_historical_aqi(coords['lat'], coords['lon'], city_name=coords['name'])
     return jsonify(data)
 
+@api_bp.route('/climatology/<city>')
+@http_cached('climatology')
+def get_climatology(city):
+    # Monthly pollutant statistics for a city, precomputed from city_day.csv by `flask build-climatology`
+    months = city_climatology(current_app.config.get('CLIMATOLOGY_PATH'), city)
+    if months is None: return jsonify({'error': f'No climatology available for "{city}".'}), 404
+    return jsonify({'city': city, 'months': months})
+
+@api_bp.route('/aqi_forecast/<city>')
+@http_cached('aqi_forecast')
+def get_aqi_forecast(city):
+    # Next-24h/48h AQI forecast precomputed by the `flask forecast-aqi` batch job
+    forecast = get_city_forecast(current_app.config.get('AQI_FORECAST_PATH'), city)
+    if forecast is None: return jsonify({'error': f'No AQI forecast available for "{city}".'}), 404
+    return jsonify(forecast)
+
+@api_bp.route('/aqi_grid')
+@http_cached('heatmap')
+def get_aqi_grid():
+    # Interpolated AQI grid precomputed by `flask build-heatmap` (binary layout documented in heatmap.py)
+    path = current_app.config.get('HEATMAP_PATH')
+    try:
+        with open(path, 'rb') as f: grid = f.read()
+        modified = os.path.getmtime(path)
+    except FileNotFoundError: return jsonify({'error': 'AQI heatmap has not been built yet.'}), 404
+    response = Response(grid, mimetype='application/octet-stream')
+    response.last_modified = datetime.fromtimestamp(modified, tz=timezone.utc)
+    return response
+
+@api_bp.route('/export')
+def export_history():
+    # Streams a filtered extract of the historical city data in chunks; completed exports are spooled
+    # to disk so interrupted downloads can resume with Range requests
+    if 'user_id' not in session: return jsonify({'error': 'Login required'}), 401
+    try: query = parse_export_query(request.args)
+    except ValueError as e: return jsonify({'error': str(e)}), 400
+    cfg = current_app.config
+    csv_path = cfg['CITY_DAY_CSV']; export_dir = os.path.join(current_app.root_path, cfg['EXPORT_DIR'])
+    etag = export_etag(csv_path, query)
+    path = spool_path(export_dir, etag, query['format'])
+    mimetype = EXPORT_FORMATS[query['format']]; filename = f"aqi_export.{query['format']}"
+    chunks = iter_export(csv_path, query, cfg['EXPORT_CHUNK_ROWS'])
+    if not os.path.exists(path): prune_spool(export_dir, cfg['EXPORT_SPOOL_TTL'], cfg['EXPORT_SPOOL_MAX_FILES'], cfg['EXPORT_SPOOL_MAX_BYTES'])
+    if request.range and not os.path.exists(path): write_spool(chunks, path)
+    if os.path.exists(path):
+        return send_file(path, mimetype=mimetype, as_attachment=True, download_name=filename, etag=etag, conditional=True)
+    response = Response(tee_to_spool(chunks, path), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
 @api_bp.route('/tips', methods=['POST'])
 def get_dynamic_tips():
     # Fetches health tips dynamically based on current AQI and context
@@ -115,6 +193,26 @@ def get_dynamic_tips():
     return jsonify({'tips': tips_json})
 
 
+# --- LIVE UPDATES (SERVER-SENT EVENTS) ---
+@api_bp.route('/live/subscribe')
+def live_subscribe():
+    # Streams AQI changes for the dashboard city and the user's favorites over one SSE connection
+    if 'user_id' not in session: return jsonify({'error': 'Login required'}), 401
+    city = request.args.get('city') or session.get('city', 'Delhi')
+    favorites = [f.city for f in Favorite.query.filter_by(user_id=session['user_id']).all()]
+    cities = list(dict.fromkeys(c.strip() for c in [city] + favorites if c and c.strip()))
+    q = live_hub.subscribe(cities)
+    if q is None:
+        logger.warning(f"Live AQI stream refused for user {session['user_id']}: subscriber limit reached")
+        return jsonify({'error': 'Live updates are at capacity; try again later.'}), 503, {'Retry-After': '60'}
+    logger.info(f"User {session['user_id']} subscribed to live AQI for {cities}")
+    heartbeat = current_app.config.get('LIVE_HEARTBEAT_INTERVAL', 20)
+    response = Response(sse_stream(live_hub, q, heartbeat), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(lambda: live_hub.unsubscribe(q)) # Frees the slot even if the stream never started
+    return response
+
+
 # --- AQI PREDICTOR ENDPOINTS ---
 
 # --- Endpoint to get current pollutant components for pre-filling ---
@@ -130,8 +228,8 @@ def get_current_pollutants():
     params = {'lat': lat, 'lon': lon, 'appid': api_key}; components = {}; error_msg = None
 
     try:
-        response = requests.get(url, params=params, timeout=10); response.raise_for_status()
-        data_list = response.json().get('list', [])
+        response_data, _ = _upstream_json('aqi', url, params, timeout=10)
+        data_list = response_data.get('list', [])
         if data_list: components = data_list[0].get('components', {})
         else: error_msg = "No pollutant data found for location."
     except requests.exceptions.Timeout: error_msg = "Pollutant data service timed out."; logger.warning(f"Timeout fetching pollutants for ({lat}, {lon})")
@@ -173,8 +271,7 @@ def handle_predict_aqi():
             logger.info(f"Prediction OK. AQI: {predicted_aqi}. Subindices: {subindices}")
             return jsonify({"success": True, "predicted_aqi": predicted_aqi, "category_info": category_info, "subindices": subindices})
         else:
-             from ml_handler import AQI_PREDICTOR_MODEL
-             if not AQI_PREDICTOR_MODEL: logger.error("Predict failed: Model not loaded."); return jsonify({'success': False, 'error': 'Prediction model not loaded.'}), 500
+             if not get_predictor_model(): logger.error("Predict failed: Model not loaded."); return jsonify({'success': False, 'error': 'Prediction model not loaded.'}), 500
              logger.error(f"Predict function returned None for data: {data}"); return jsonify({'success': False, 'error': 'Prediction failed. Check logs.'}), 500
 
     except Exception as e: logger.exception(f"Unexpected error in /predict_aqi: {e}"); return jsonify({'success': False, 'error': 'Internal server error.'}), 500
@@ -208,9 +305,24 @@ def add_favorite():
     city_cleaned = city.strip()
     if Favorite.query.filter_by(user_id=user_id, city=city_cleaned).first(): return jsonify({'success': True, 'message': f'{city_cleaned} is already in favorites.'})
     fav = Favorite(user_id=user_id, city=city_cleaned)
-    try: db.session.add(fav); db.session.commit(); logger.info(f"User {user_id} added favorite: {city_cleaned}"); return jsonify({'success': True, 'message': f'{city_cleaned} added to favorites.'})
+    try: db.session.add(fav); db.session.commit(); city_rankings.track(city_cleaned); logger.info(f"User {user_id} added favorite: {city_cleaned}"); return jsonify({'success': True, 'message': f'{city_cleaned} added to favorites.'})
     except Exception as e: db.session.rollback(); logger.error(f"DB error adding favorite for user {user_id}: {e}", exc_info=True); return jsonify({'success': False, 'error': 'Database error.'}), 500
 
+@api_bp.route('/favorites_overview')
+def favorites_overview():
+    # Current AQI of every favorite in one response: one query, then concurrent fetches that reuse cached snapshots
+    if 'user_id' not in session: return jsonify({'error': 'Login required'}), 401
+    cities = [f.city for f in Favorite.query.filter_by(user_id=session['user_id']).all()]
+    snapshots = fetch_aqi_batch(cities)
+    favorites = []
+    for city in cities:
+        data = snapshots.get(city.strip(), {'error': 'No data.'})
+        if 'error' in data: favorites.append({'city': city, 'error': data['error']}); continue
+        favorites.append({'city': city, 'name': data.get('city'), 'aqi': data.get('aqi'), 'main_pollutant': data.get('main_pollutant'),
+                          'category': get_aqi_category(data.get('aqi')), 'dt': data.get('dt'), 'updated': data.get('updated'),
+                          'stale': bool(data.get('stale'))})
+    return jsonify({'favorites': favorites})
+
 @api_bp.route('/remove_favorite', methods=['POST'])
 def remove_favorite():
     # Removes a city from the user's favorite list
@@ -226,38 +338,42 @@ def remove_favorite():
 
 # --- TOP CITIES AQI ENDPOINT ---
 @api_bp.route('/top_cities_aqi')
+@http_cached('aqi')
 def top_cities_aqi():
-    # Fetches and returns a sorted list of AQI for major Indian and World cities
-    indian_cities = ["Delhi", "Mumbai", "Kolkata", "Chennai", "Bangalore", "Hyderabad", "Pune", "Ahmedabad", "Jaipur", "Lucknow", "Kanpur", "Nagpur", "Patna", "Indore", "Thane"]
-    world_cities = ["Beijing", "New York", "London", "Tokyo", "Paris", "Los Angeles", "Mexico City", "Sao Paulo", "Cairo", "Moscow", "Jakarta", "Seoul", "Sydney", "Berlin", "Rome"]
-    top_cities_data = {'india': [], 'world': []}
-
-    # Fetch Indian cities
-    for city_name in indian_cities:
-        coords = get_coords_from_city(city_name)
-        if 'error' in coords: logger.warning(f"Skipping Indian city {city_name} (geocoding error)"); continue
-        aqi_data = fetch_aqi(coords['lat'], coords['lon'], coords['name'])
-        if 'error' not in aqi_data: top_cities_data['india'].append({'city': aqi_data.get('city'), 'aqi': aqi_data.get('aqi'), 'category': get_aqi_category(aqi_data.get('aqi', -1))})
-        else: logger.warning(f"Skipping Indian city {city_name} (AQI fetch error)")
-
-    # Fetch World cities
-    for city_name in world_cities:
-        coords = get_coords_from_city(city_name)
-        if 'error' in coords: logger.warning(f"Skipping World city {city_name} (geocoding error)"); continue
-        aqi_data = fetch_aqi(coords['lat'], coords['lon'], coords['name'])
-        if 'error' not in aqi_data: top_cities_data['world'].append({'city': aqi_data.get('city'), 'aqi': aqi_data.get('aqi'), 'category': get_aqi_category(aqi_data.get('aqi', -1))})
-        else: logger.warning(f"Skipping World city {city_name} (AQI fetch error)")
-
-    # Sort lists by AQI (descending - worst first)
-    top_cities_data['india'].sort(key=lambda x: int(x.get('aqi', -1)), reverse=True)
-    top_cities_data['world'].sort(key=lambda x: int(x.get('aqi', -1)), reverse=True)
-
-    logger.info("Successfully compiled top cities AQI data.")
-    return jsonify(top_cities_data)
+    # Worst-first AQI leaderboards for India and the world, read from the incrementally updated rankings
+    k = max(1, min(request.args.get('k', 15, type=int), 100))
+    city_rankings.warm() # Starts the refresh worker; never fetches on the request thread
+    india, _ = city_rankings.top('india', k); world, _ = city_rankings.top('world', k)
+    warming = city_rankings.pending() > 0
+    if warming: _mark_degraded() # Partial leaderboards must not be cached while the first pass is running
+    return jsonify({'india': india, 'world': world, 'warming': warming})
+
+@api_bp.route('/rankings/<region>')
+@http_cached('aqi')
+def get_rankings(region):
+    # Top-k (or ?order=bottom for the cleanest) cities of a region: india, world or all
+    if region not in REGIONS: return jsonify({'error': f'Unknown region "{region}".'}), 404
+    k = max(1, min(request.args.get('k', 10, type=int), 500))
+    bottom = request.args.get('order', 'top') == 'bottom'
+    cities, total = city_rankings.top(region, k, bottom=bottom)
+    warming = city_rankings.pending() > 0
+    if warming: _mark_degraded()
+    return jsonify({'region': region, 'order': 'bottom' if bottom else 'top', 'total': total, 'cities': cities, 'warming': warming})
+
+@api_bp.route('/rankings/<region>/<city>')
+@http_cached('aqi')
+def get_city_rank(region, city):
+    # Rank of one city (1 = most polluted) within a region
+    if region not in REGIONS: return jsonify({'error': f'Unknown region "{region}".'}), 404
+    rank = city_rankings.rank(region, city)
+    if city_rankings.pending(): _mark_degraded() # Positions shift until every tracked city has been ranked once
+    if rank is None: return jsonify({'error': f'"{city}" is not ranked in {region}.'}), 404
+    return jsonify(rank)
 
 
 # --- MAP DATA ROUTES ---
 @api_bp.route('/map_cities_data')
+@http_cached('aqi')
 def map_cities_data():
     # Fetches AQI/Weather data for default map markers
     cities = ['Delhi', 'Mumbai', 'Bangalore', 'Chennai', 'Kolkata', 'Hyderabad', 'Pune', 'New York', 'London', 'Tokyo', 'Beijing', 'Sydney']
@@ -272,6 +388,7 @@ def map_cities_data():
     return jsonify(data)
 
 @api_bp.route('/city_data/<city_from_url>')
+@http_cached('aqi')
 def get_city_data(city_from_url):
     # Fetches AQI and Weather for a single city searched on the map/dashboard
     logger.info(f"--- [get_city_data] Received request for city: '{city_from_url}' ---")
@@ -289,6 +406,17 @@ def get_city_data(city_from_url):
     return jsonify(aqi_data)
 
 
+# --- OPERATIONAL METRICS ---
+@api_bp.route('/metrics')
+def get_metrics():
+    # Exposes upstream budget, circuit states, live-update fan-out and prediction cache stats for monitoring
+    metrics = {'upstream_budget': governor.metrics(), 'circuits': breaker_metrics(), 'live_updates': live_hub.stats(), 'rankings': city_rankings.stats(),
+               'prediction_cache': prediction_cache_stats(),
+               'startup_ms': current_app.extensions.get('startup_timings', {})}
+    if 'profiler' in current_app.extensions: metrics['profiled_routes'] = current_app.extensions['profiler'].summary()
+    return jsonify(metrics)
+
+
 # --- AUTOCOMPLETE ENDPOINT ---
 @api_bp.route('/autocomplete_city')
 def autocomplete_city():
@@ -309,8 +437,7 @@ def autocomplete_city():
     suggestions = []; unique_names = set()
 
     try:
-        response = requests.get(url, params=params, timeout=3); response.raise_for_status()
-        data = response.json()
+        data, _ = _upstream_json('geocode', url, params, timeout=3, priority='autocomplete')
 
         for item in data:
             parts = [item.get('name')];
@@ -349,8 +476,7 @@ def get_city_from_coords():
     city_name = None
 
     try:
-        response = requests.get(url, params=params, timeout=5); response.raise_for_status()
-        data = response.json()
+        data, _ = _upstream_json('geocode', url, params, timeout=5)
 
         if data and isinstance(data, list) and len(data) > 0:
             city_info = data[0]; city_name = city_info.get('name')
@@ -0,0 +1,156 @@
+# routes/live.py
+
+import json
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from .utils import fetch_aqi, get_coords_from_city
+
+logger = logging.getLogger(__name__)
+
+
+class LiveAQIHub:
+    """Fans out one shared upstream AQI refresh per city to every subscribed dashboard.
+
+    Each subscriber gets a bounded queue of ``(event, payload)`` tuples. A single
+    background thread refreshes every city that has at least one subscriber once per
+    ``LIVE_REFRESH_INTERVAL`` seconds, so upstream cost scales with the number of
+    watched cities rather than with viewers or page reloads.
+
+    Every open stream holds one server thread, so at most ``LIVE_MAX_SUBSCRIBERS``
+    streams are accepted per process; `subscribe()` returns None beyond that.
+    """
+
+    def __init__(self, refresh_interval=300, queue_size=32, max_subscribers=8):
+        self.refresh_interval = refresh_interval
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._queues = set()                  # Every open subscriber queue
+        self._app = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._subscribers = defaultdict(set)  # city key -> {queue, ...}
+        self._names = {}                      # city key -> name as first subscribed
+        self._snapshots = {}                  # city key -> last fetch_aqi payload
+        self._refreshed_at = {}               # city key -> monotonic time of last refresh
+
+    def init_app(self, app):
+        self._app = app
+        self.refresh_interval = app.config.get('LIVE_REFRESH_INTERVAL', self.refresh_interval)
+        self.queue_size = app.config.get('LIVE_QUEUE_SIZE', self.queue_size)
+        self.max_subscribers = app.config.get('LIVE_MAX_SUBSCRIBERS', self.max_subscribers)
+        app.extensions['live_hub'] = self
+
+    @staticmethod
+    def _key(city):
+        return city.strip().lower()
+
+    def subscribe(self, cities):
+        """Registers a new subscriber for the given cities and returns its event queue (None when full)."""
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if len(self._queues) >= self.max_subscribers: return None
+            self._queues.add(q)
+            for city in cities:
+                key = self._key(city)
+                if not key: continue
+                self._subscribers[key].add(q)
+                self._names.setdefault(key, city.strip())
+                snapshot = self._snapshots.get(key)
+                if snapshot is not None:
+                    self._offer(q, 'snapshot', {'city': self._names[key], 'data': snapshot})
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='live-aqi-hub', daemon=True)
+                self._thread.start()
+        self._wakeup.set() # Let the worker pick up cities that have never been fetched
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._queues.discard(q)
+            for key in [k for k, subs in self._subscribers.items() if q in subs]:
+                self._subscribers[key].discard(q)
+                if not self._subscribers[key]:
+                    del self._subscribers[key]
+                    self._snapshots.pop(key, None); self._refreshed_at.pop(key, None); self._names.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {'cities': len(self._subscribers), 'subscriptions': sum(len(s) for s in self._subscribers.values()),
+                    'streams': len(self._queues), 'max_streams': self.max_subscribers}
+
+    def _offer(self, q, event, payload):
+        # Slow consumers get their backlog replaced by a full snapshot instead of blocking the fan-out
+        try:
+            q.put_nowait((event, payload))
+        except queue.Full:
+            while True:
+                try: q.get_nowait()
+                except queue.Empty: break
+            if event == 'update':
+                key = self._key(payload['city'])
+                event, payload = 'snapshot', {'city': payload['city'], 'data': self._snapshots.get(key, {})}
+            q.put_nowait((event, payload))
+
+    def _run(self):
+        logger.info("Live AQI hub worker started.")
+        while True:
+            with self._lock:
+                cities = list(self._subscribers)
+                if not cities:
+                    self._thread = None
+                    logger.info("Live AQI hub worker stopped (no subscribers).")
+                    return
+            now = time.monotonic()
+            due = [c for c in cities if now - self._refreshed_at.get(c, float('-inf')) >= self.refresh_interval]
+            if due:
+                with self._app.app_context():
+                    for key in due: self._refresh(key)
+            with self._lock:
+                pending = [self._refreshed_at.get(c, 0) for c in self._subscribers]
+            next_due = min(pending) + self.refresh_interval - time.monotonic() if pending else self.refresh_interval
+            self._wakeup.wait(timeout=max(1.0, next_due))
+            self._wakeup.clear()
+
+    def _refresh(self, key):
+        name = self._names.get(key, key)
+        self._refreshed_at[key] = time.monotonic()
+        try:
+            coords = get_coords_from_city(name, priority='background')
+            if 'error' in coords: logger.warning(f"Live hub skipping {name} (geocoding error): {coords['error']}"); return
+            data = fetch_aqi(coords['lat'], coords['lon'], coords['name'], priority='background')
+            if 'error' in data: logger.warning(f"Live hub skipping {name} (AQI error): {data['error']}"); return
+        except Exception as e:
+            logger.exception(f"Live hub refresh failed for {name}: {e}"); return
+
+        with self._lock:
+            previous = self._snapshots.get(key)
+            self._snapshots[key] = data
+            if previous is None:
+                event, payload = 'snapshot', {'city': name, 'data': data}
+            else:
+                changes = {k: v for k, v in data.items() if previous.get(k) != v}
+                if not changes: return
+                event, payload = 'update', {'city': name, 'changes': changes}
+            for q in list(self._subscribers.get(key, ())):
+                self._offer(q, event, payload)
+        logger.debug(f"Live hub published {event} for {name}")
+
+
+def sse_stream(hub, q, heartbeat=20):
+    """Yields server-sent events from a hub queue; unsubscribes when the client disconnects."""
+    try:
+        yield 'retry: 10000\n\n'
+        while True:
+            try: event, payload = q.get(timeout=heartbeat)
+            except queue.Empty: yield ': keep-alive\n\n'; continue
+            yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    finally:
+        hub.unsubscribe(q)
+
+
+live_hub = LiveAQIHub()
@@ -0,0 +1,220 @@
+# routes/rankings.py
+
+import bisect
+import csv
+import logging
+import threading
+import time
+
+from flask import g
+
+from ml_handler import get_aqi_category
+from .utils import fetch_aqi, get_coords_from_city, governor, snapshot_listeners
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDIAN_CITIES = ["Delhi", "Mumbai", "Kolkata", "Chennai", "Bangalore", "Hyderabad", "Pune", "Ahmedabad", "Jaipur", "Lucknow", "Kanpur", "Nagpur", "Patna", "Indore", "Thane"]
+DEFAULT_WORLD_CITIES = ["Beijing", "New York", "London", "Tokyo", "Paris", "Los Angeles", "Mexico City", "Sao Paulo", "Cairo", "Moscow", "Jakarta", "Seoul", "Sydney", "Berlin", "Rome"]
+REGIONS = ('india', 'world', 'all')
+
+
+class RankedIndex:
+    """AQI leaderboard for one region: a sorted list of (aqi, city key) plus a key -> entry map.
+
+    Positions are found with bisect, so updates, top/bottom-k slices and rank lookups need
+    O(log n) comparisons; the list shift on insert/delete is a memmove that stays negligible
+    for thousands of cities.
+    """
+
+    def __init__(self):
+        self._order = []
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._order)
+
+    def update(self, key, entry):
+        self.remove(key)
+        bisect.insort(self._order, (entry['aqi'], key))
+        self._entries[key] = entry
+
+    def remove(self, key):
+        old = self._entries.pop(key, None)
+        if old is not None: del self._order[bisect.bisect_left(self._order, (old['aqi'], key))]
+
+    def entry(self, key):
+        return self._entries.get(key)
+
+    def top(self, k):
+        """The k most polluted cities, worst first."""
+        return [self._entries[key] for _, key in reversed(self._order[-k:])] if k > 0 else []
+
+    def bottom(self, k):
+        """The k cleanest cities, cleanest first."""
+        return [self._entries[key] for _, key in self._order[:max(k, 0)]]
+
+    def rank(self, key):
+        """1-based position counted from the most polluted city, or None if the city is not ranked."""
+        entry = self._entries.get(key)
+        if entry is None: return None
+        return len(self._order) - bisect.bisect_left(self._order, (entry['aqi'], key))
+
+
+class CityRankings:
+    """Incrementally maintained AQI leaderboards (India, world, all) over every tracked city.
+
+    Tracked cities are the defaults, every city in CITY_DAY_CSV and all users' favorites. A
+    background thread refreshes each of them at background priority once per
+    ``RANKING_REFRESH_INTERVAL`` seconds. It runs at full speed while the call budget has headroom
+    and slows to the budget's refill rate once the background share runs low; cities the budget
+    denies are retried after ``RANKING_RETRY_DELAY`` seconds. Any other fresh fetch_aqi snapshot of
+    a tracked city (dashboards, map, live updates) is applied as it arrives. Requests only read the in-memory
+    indexes, so leaderboard and rank queries never wait on upstream calls.
+    """
+
+    def __init__(self, refresh_interval=1800, retry_delay=30):
+        self.refresh_interval = refresh_interval
+        self.retry_delay = retry_delay
+        self._app = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._indexes = {region: RankedIndex() for region in REGIONS}
+        self._tracked = {}       # city key -> name as tracked
+        self._aliases = {}       # city key -> geocoded city key (e.g. "bangalore" -> "bengaluru")
+        self._regions = {}       # geocoded city key -> 'india' / 'world'
+        self._refreshed_at = {}  # city key -> monotonic time of last budget-allowed refresh
+
+    def init_app(self, app):
+        self._app = app
+        self.refresh_interval = app.config.get('RANKING_REFRESH_INTERVAL', self.refresh_interval)
+        self.retry_delay = app.config.get('RANKING_RETRY_DELAY', self.retry_delay)
+        for name in DEFAULT_INDIAN_CITIES + DEFAULT_WORLD_CITIES: self.track(name)
+        snapshot_listeners.append(self.observe)
+        app.extensions['rankings'] = self
+
+    @staticmethod
+    def _key(city):
+        return city.strip().lower()
+
+    def track(self, city):
+        """Adds a city to the ranked set; the worker picks it up on its next pass."""
+        key = self._key(city)
+        if not key: return
+        with self._lock:
+            if key in self._tracked: return
+            self._tracked[key] = city.strip()
+        self._wakeup.set()
+
+    def observe(self, snapshot):
+        """Applies a fetch_aqi result if it belongs to a tracked, already geocoded city."""
+        key = self._key(snapshot.get('city') or '')
+        region = self._regions.get(key)
+        aqi = snapshot.get('aqi')
+        if region is None or not isinstance(aqi, (int, float)): return # Unknown city or 'N/A' AQI: never ranked
+        entry = {'city': snapshot['city'], 'aqi': aqi, 'dt': snapshot.get('dt'), 'category': get_aqi_category(aqi)}
+        with self._lock:
+            self._indexes[region].update(key, entry)
+            self._indexes['all'].update(key, entry)
+
+    # --- Queries ---
+    def top(self, region, k, bottom=False):
+        """Returns (entries, ranked city count) for a region's top-k (or bottom-k) leaderboard."""
+        self._ensure_worker()
+        with self._lock:
+            index = self._indexes[region]
+            return (index.bottom(k) if bottom else index.top(k)), len(index)
+
+    def rank(self, region, city):
+        self._ensure_worker()
+        key = self._key(city)
+        with self._lock:
+            key = self._aliases.get(key, key)
+            index = self._indexes[region]
+            position = index.rank(key)
+            if position is None: return None
+            return {**index.entry(key), 'rank': position, 'total': len(index), 'region': region}
+
+    def warm(self):
+        """Starts the background worker if needed; never fetches on the caller's thread."""
+        self._ensure_worker()
+
+    def pending(self):
+        """Number of tracked cities that have not had a budget-allowed refresh yet."""
+        with self._lock: return sum(1 for k in self._tracked if k not in self._refreshed_at)
+
+    def stats(self):
+        with self._lock:
+            return {'tracked': len(self._tracked), 'pending': sum(1 for k in self._tracked if k not in self._refreshed_at),
+                    'ranked': {region: len(index) for region, index in self._indexes.items()}}
+
+    # --- Background refresh ---
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='city-rankings', daemon=True)
+                self._thread.start()
+
+    def _track_known_cities(self):
+        from models import db, Favorite
+        try:
+            with open(self._app.config['CITY_DAY_CSV'], newline='') as f:
+                for name in {row['City'] for row in csv.DictReader(f)}: self.track(name)
+        except OSError as e: logger.warning(f"Rankings could not read tracked cities from CITY_DAY_CSV: {e}")
+        for (name,) in db.session.query(Favorite.city).distinct(): self.track(name)
+
+    def _run(self):
+        logger.info("City rankings worker started.")
+        with self._app.app_context():
+            try: self._track_known_cities()
+            except Exception as e: logger.exception(f"Loading tracked cities failed: {e}")
+        while True:
+            self._wakeup.clear() # Cities tracked during the pass set it again and are picked up right after
+            now = time.monotonic()
+            with self._lock:
+                # Never-refreshed cities first, then the longest-unrefreshed ones
+                due = sorted((k for k in self._tracked if now - self._refreshed_at.get(k, float('-inf')) >= self.refresh_interval),
+                             key=lambda k: self._refreshed_at.get(k, float('-inf')))
+            refreshed, denied = 0, False
+            for key in due:
+                calls, denied = self._refresh(key)
+                if denied: break # Budget spent: leave the rest unstamped and retry them soon
+                refreshed += 1
+                if calls:
+                    # Full speed while the budget has headroom; at its refill rate once it runs low
+                    with self._app.app_context(): pace = governor.pace('background')
+                    time.sleep(calls * pace)
+            if due: logger.info(f"City rankings refreshed {refreshed}/{len(due)} due cities{' (budget exhausted)' if denied else ''}: {self.stats()['ranked']}")
+            if denied: wait = self.retry_delay
+            else:
+                with self._lock: stamps = [self._refreshed_at.get(k, 0) for k in self._tracked]
+                wait = min(stamps) + self.refresh_interval - time.monotonic() if stamps else self.refresh_interval
+            self._wakeup.wait(timeout=max(1.0, wait))
+
+    def _refresh(self, key):
+        """Refreshes one city in its own app context; returns (upstream calls made, budget denied).
+
+        The city is only stamped as refreshed when the budget allowed every call it needed."""
+        name = self._tracked.get(key, key)
+        data = None
+        with self._app.app_context():
+            try:
+                coords = get_coords_from_city(name, priority='background')
+                if 'error' in coords: logger.warning(f"Rankings skipping {name} (geocoding error): {coords['error']}")
+                else:
+                    canonical = self._key(coords['name'])
+                    with self._lock:
+                        self._aliases[key] = canonical
+                        self._regions[canonical] = 'india' if coords.get('country') == 'IN' else 'world'
+                    data = fetch_aqi(coords['lat'], coords['lon'], coords['name'], priority='background')
+                    if 'error' in data: logger.warning(f"Rankings skipping {name} (AQI error): {data['error']}"); data = None
+            except Exception as e:
+                logger.exception(f"Rankings refresh failed for {name}: {e}")
+            calls, denied = g.get('upstream_calls', 0), g.get('upstream_denied', False)
+        if data is not None: self.observe(data) # Stale fallbacks are not broadcast to listeners but still beat an empty slot
+        if not denied:
+            with self._lock: self._refreshed_at[key] = time.monotonic()
+        return calls, denied
+
+
+city_rankings = CityRankings()
@@ -2,14 +2,18 @@
 
 # ... (imports and other functions remain the same) ...
 import requests
-from flask import current_app
+from flask import current_app, request, g
+from functools import wraps
 from datetime import datetime, timedelta, timezone
 import math
 from models import db, Tip
-from extensions import cache # Make sure cache is imported
+from extensions import cache, recorder # Make sure cache is imported
+from climatology import compare_to_typical
 from sqlalchemy import or_
 import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+import threading
 import logging
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(levelname)s:%(name)s:%(message)s')
@@ -55,11 +59,240 @@ def calculate_indian_aqi(components):
     max_pollutant = max(valid_indices, key=valid_indices.get); aqi = valid_indices[max_pollutant]
     return round(aqi) if aqi is not None else 'N/A', max_pollutant
 
+# --- HTTP Caching for JSON Endpoints ---
+def _latest_dt(payload):
+    """Returns the upstream `dt` timestamp of a single-reading JSON payload, if any."""
+    if isinstance(payload, dict) and isinstance(payload.get('dt'), (int, float)): return payload['dt']
+    return None
+
+def http_cached(source, last_modified=False):
+    """Adds ETag and Cache-Control (max-age = the source's TTL) to a JSON view and answers matching
+    If-None-Match requests with 304.
+
+    `last_modified=True` also sets Last-Modified from the payload's `dt`; only use it for views
+    returning one upstream reading, since a combined payload (several cities, nested weather, ranks)
+    can change without its newest `dt` changing and If-Modified-Since would then 304 new content.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = current_app.make_response(view(*args, **kwargs))
+            if request.method != 'GET' or response.status_code != 200: return response
+            payload = response.get_json(silent=True)
+            response.cache_control.public = True
+            # Degraded answers (stale upstream data or simulated history anywhere in the payload) must not be
+            # pinned in browser or proxy caches
+            stale = g.get('upstream_degraded') or (isinstance(payload, dict) and payload.get('stale'))
+            response.cache_control.max_age = 0 if stale else current_app.config.get('UPSTREAM_TTLS', {}).get(source, 300)
+            last_dt = _latest_dt(payload) if last_modified else None
+            if last_dt: response.last_modified = datetime.fromtimestamp(last_dt, tz=timezone.utc)
+            response.add_etag()
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+
+# --- Upstream Call Budget (Token Buckets) ---
+class UpstreamBudgetExceeded(requests.exceptions.RequestException):
+    """Raised when the shared OpenWeather call budget has no token left for a request's priority."""
+
+class TokenBucket:
+    """Classic token bucket: `capacity` tokens, refilled continuously over `period` seconds."""
+    def __init__(self, capacity, period):
+        self.capacity = float(capacity); self.rate = self.capacity / period
+        self.tokens = self.capacity; self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate); self.updated = now
+        return self.tokens
+
+class RateGovernor:
+    """OpenWeather call budget with per-minute and per-day buckets.
+
+    The buckets live in this process, so each of the UPSTREAM_WORKER_PROCESSES workers gets an equal
+    share of the configured limits and together they stay within the single account quota.
+    Each priority class keeps a fraction of both buckets in reserve for the classes above it,
+    so background warmers and autocomplete run dry before interactive dashboard fetches do.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = None
+        self._reserves = {}
+        self._granted = defaultdict(int); self._denied = defaultdict(int)
+
+    def _configure(self):
+        config = current_app.config
+        workers = max(1, int(config.get('UPSTREAM_WORKER_PROCESSES', 1)))
+        self._buckets = {'minute': TokenBucket(max(1.0, config.get('UPSTREAM_CALLS_PER_MINUTE', 60) / workers), 60),
+                         'day': TokenBucket(max(1.0, config.get('UPSTREAM_CALLS_PER_DAY', 30000) / workers), 86400)}
+        self._reserves = config.get('UPSTREAM_PRIORITY_RESERVES', {'interactive': 0.0})
+
+    def acquire(self, priority='interactive'):
+        """Takes one token from every bucket if the priority's reserve allows it; returns success."""
+        with self._lock:
+            if self._buckets is None: self._configure()
+            reserve = self._reserves.get(priority, max(self._reserves.values(), default=0.0))
+            if all(b.refill() - 1 >= reserve * b.capacity for b in self._buckets.values()):
+                for bucket in self._buckets.values(): bucket.tokens -= 1
+                self._granted[priority] += 1
+                return True
+            self._denied[priority] += 1
+            return False
+
+    def pace(self, priority='interactive'):
+        """Seconds a steady caller of this priority should leave between calls.
+
+        0 while every bucket still holds more than half of the priority's usable share (capacity above
+        its reserve); once a bucket drops below that, the interval at which that bucket refills it.
+        """
+        with self._lock:
+            if self._buckets is None: self._configure()
+            reserve = self._reserves.get(priority, max(self._reserves.values(), default=0.0))
+            wait = 0.0
+            for b in self._buckets.values():
+                usable = b.capacity * (1 - reserve)
+                if b.refill() - reserve * b.capacity < usable / 2: wait = max(wait, 1.0 / max(b.rate * (1 - reserve), 1e-9))
+            return wait
+
+    def metrics(self):
+        with self._lock:
+            if self._buckets is None: return {'buckets': {}, 'granted': {}, 'denied': {}}
+            return {'buckets': {name: {'capacity': int(b.capacity), 'remaining': round(b.refill(), 2),
+                                       'used_fraction': round(1 - b.tokens / b.capacity, 4)} for name, b in self._buckets.items()},
+                    'granted': dict(self._granted), 'denied': dict(self._denied)}
+
+governor = RateGovernor()
+
+# --- Circuit Breakers (Per Upstream Endpoint) ---
+class UpstreamUnavailable(requests.exceptions.RequestException):
+    """Raised when an endpoint's circuit is open and no cached response exists to fall back on."""
+
+class CircuitBreaker:
+    """Closed -> open after `threshold` consecutive failures. While open, calls fail fast; once `cooldown`
+    seconds have passed a single background probe is let through and its success closes the circuit."""
+    def __init__(self, name, threshold, cooldown):
+        self.name = name; self.threshold = threshold; self.cooldown = cooldown
+        self.state = 'closed'; self.failures = 0; self.opened_at = 0.0; self.probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock: return self.state == 'closed'
+
+    def claim_probe(self):
+        """Returns True for exactly one caller once the cooldown has elapsed on an open circuit."""
+        with self._lock:
+            if self.state == 'open' and not self.probing and time.monotonic() - self.opened_at >= self.cooldown:
+                self.probing = True; return True
+            return False
+
+    def release_probe(self):
+        with self._lock: self.probing = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed': logging.info(f"Circuit for '{self.name}' closed; upstream recovered.")
+            self.state = 'closed'; self.failures = 0; self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1; self.probing = False
+            if self.state == 'open' or self.failures >= self.threshold:
+                if self.state != 'open': logging.error(f"Circuit for '{self.name}' opened after {self.failures} failures.")
+                self.state = 'open'; self.opened_at = time.monotonic()
+
+    def metrics(self):
+        with self._lock: return {'state': self.state, 'consecutive_failures': self.failures}
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(source):
+    with _breakers_lock:
+        if source not in _breakers:
+            config = current_app.config
+            _breakers[source] = CircuitBreaker(source, config.get('CIRCUIT_FAILURE_THRESHOLD', 3), config.get('CIRCUIT_COOLDOWN', 30))
+        return _breakers[source]
+
+def breaker_metrics():
+    with _breakers_lock: return {name: b.metrics() for name, b in _breakers.items()}
+
+def _is_upstream_failure(exc):
+    # Client errors (bad key, unknown location) say nothing about upstream health; 429 and 5xx do
+    response = getattr(exc, 'response', None)
+    return response is None or response.status_code == 429 or response.status_code >= 500
+
+
+def _upstream_cache_key(source, params):
+    parts = [f"{k}={round(float(v), 4) if k in ('lat', 'lon') else v}" for k, v in sorted(params.items()) if k != 'appid']
+    return f"upstream:{source}:" + "&".join(parts)
+
+def _fetch_and_store(source, url, params, timeout, key, ttl):
+    response = requests.get(url, params=params, timeout=timeout); response.raise_for_status()
+    data = response.json()
+    cache.set(key, {'data': data, 'fetched_at': time.time()}, timeout=max(ttl, current_app.config.get('UPSTREAM_STALE_TTL', 86400)))
+    return data
+
+def _probe(app, breaker, source, url, params, timeout, key, ttl):
+    with app.app_context():
+        if not governor.acquire('background'):
+            breaker.release_probe(); return # Try again on a later request once the budget allows it
+        try:
+            _fetch_and_store(source, url, params, timeout, key, ttl); breaker.record_success()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logging.warning(f"Probe for '{source}' failed: {e}"); breaker.record_failure()
+
+def _mark_degraded():
+    """Flags the current request as answered from stale or simulated data (checked by http_cached)."""
+    g.upstream_degraded = True
+
+def _upstream_json(source, url, params, timeout, priority='interactive'):
+    """GETs an OpenWeather endpoint through the shared response cache, call budget and circuit breaker.
+
+    Fresh cached responses (younger than the source's TTL) are returned without an upstream call.
+    When the budget is exhausted, the endpoint's circuit is open, or the call fails, the last cached
+    response is served instead, flagged as stale. An open circuit is probed in a background thread.
+    Returns a `(data, stale)` tuple; raises `requests` exceptions like a plain `requests.get`.
+    """
+    key = _upstream_cache_key(source, params)
+    ttl = current_app.config.get('UPSTREAM_TTLS', {}).get(source, 300)
+    entry = cache.get(key)
+    if entry and time.time() - entry['fetched_at'] < ttl: return entry['data'], False
+
+    breaker = get_breaker(source)
+    if not breaker.allow():
+        if breaker.claim_probe():
+            threading.Thread(target=_probe, args=(current_app._get_current_object(), breaker, source, url, params, timeout, key, ttl),
+                             name=f"probe-{source}", daemon=True).start()
+        if entry: logging.warning(f"Circuit for '{source}' open; serving stale data."); _mark_degraded(); return entry['data'], True
+        raise UpstreamUnavailable(f"{source} service is temporarily unavailable.")
+
+    if not governor.acquire(priority):
+        g.upstream_denied = True
+        if entry: logging.warning(f"Upstream budget exhausted ({priority}); serving stale {source} data."); _mark_degraded(); return entry['data'], True
+        raise UpstreamBudgetExceeded(f"Upstream call budget exhausted for {priority} requests.")
+
+    g.upstream_calls = g.get('upstream_calls', 0) + 1
+    try:
+        data = _fetch_and_store(source, url, params, timeout, key, ttl)
+    except requests.exceptions.RequestException as e:
+        if not _is_upstream_failure(e): raise
+        breaker.record_failure()
+        if entry: logging.warning(f"{source} request failed ({e}); serving stale data."); _mark_degraded(); return entry['data'], True
+        raise
+    breaker.record_success()
+    return data, False
+
+
+# Callables notified with every fresh fetch_aqi result (e.g. the city rankings)
+snapshot_listeners = []
+
+
 # --- API Fetching Functions ---
 
 # Keep prefix for coords as city name should be unique enough and used directly
 # --- @cache.cached(timeout=3600, key_prefix='coords_%s')
-def get_coords_from_city(city_name):
+def get_coords_from_city(city_name, priority='interactive'):
     # ... (function code is correct) ...
     logging.debug(f"Fetching coordinates for city: {city_name}")
     api_key = current_app.config.get('OPENWEATHER_API_KEY')
@@ -67,10 +300,9 @@ def get_coords_from_city(city_name):
     if not api_key: logging.error("OPENWEATHER_API_KEY not configured."); return {'error': 'Server configuration error: API key missing.'}
     params = {'q': city_name, 'limit': 1, 'appid': api_key}
     try:
-        response = requests.get(url, params=params, timeout=5); response.raise_for_status()
-        data = response.json()
+        data, _ = _upstream_json('geocode', url, params, timeout=5, priority=priority)
         if not data: logging.warning(f"Geocoding API returned no results for city: {city_name}"); return {'error': f'City "{city_name}" not found.'}
-        result = {'lat': data[0].get('lat'), 'lon': data[0].get('lon'), 'name': data[0].get('name')}
+        result = {'lat': data[0].get('lat'), 'lon': data[0].get('lon'), 'name': data[0].get('name'), 'country': data[0].get('country')}
         if result['lat'] is None or result['lon'] is None: logging.error(f"Geocoding API response missing lat/lon for {city_name}: {data[0]}"); return {'error': f'Incomplete location data for "{city_name}".'}
         logging.debug(f"Coordinates found for {city_name}: {result}"); return result
     except requests.exceptions.Timeout: logging.error(f"Geocoding API request timed out for city: {city_name}"); return {'error': 'Geocoding service timed out.'}
@@ -80,7 +312,7 @@ def get_coords_from_city(city_name):
 
 # --- REMOVED key_prefix ---
 # --- @cache.cached(timeout=300) # Let Flask-Caching use args for key
-def fetch_aqi(lat, lon, city_name_display):
+def fetch_aqi(lat, lon, city_name_display, priority='interactive'):
     # Cache key will now be based on function name + lat + lon + city_name_display
     logging.debug(f"Fetching AQI for {city_name_display} ({lat}, {lon})")
     # ... (rest of function is correct) ...
@@ -89,12 +321,18 @@ def fetch_aqi(lat, lon, city_name_display):
     if not api_key: logging.error("OPENWEATHER_API_KEY not configured for fetch_aqi."); return {'error': 'Server configuration error: API key missing.'}
     params = {'lat': lat, 'lon': lon, 'appid': api_key}
     try:
-        response = requests.get(url, params=params, timeout=10); response.raise_for_status()
-        api_response_data = response.json(); data_list = api_response_data.get('list', [])
+        api_response_data, stale = _upstream_json('aqi', url, params, timeout=10, priority=priority); data_list = api_response_data.get('list', [])
         if not data_list: logging.warning(f"Air Pollution API returned empty list for ({lat}, {lon})"); return {'error': 'Air Pollution data currently unavailable for this location.'}
         data = data_list[0]; comp = data.get('components', {}); dt_timestamp = data.get('dt')
         aqi_value, main_pollutant = calculate_indian_aqi(comp)
-        result = {'aqi': aqi_value, 'main_pollutant': main_pollutant, 'city': city_name_display, 'geo': [lat, lon], 'pm25': comp.get('pm2_5', 'N/A'), 'pm10': comp.get('pm10', 'N/A'), 'no': comp.get('no', 'N/A'), 'no2': comp.get('no2', 'N/A'), 'so2': comp.get('so2', 'N/A'), 'co': comp.get('co', 'N/A'), 'o3': comp.get('o3', 'N/A'), 'nh3': comp.get('nh3', 'N/A'), 'updated': datetime.fromtimestamp(dt_timestamp).strftime('%d %b %Y, %I:%M %p') if dt_timestamp else 'N/A'}
+        result = {'aqi': aqi_value, 'main_pollutant': main_pollutant, 'city': city_name_display, 'geo': [lat, lon], 'pm25': comp.get('pm2_5', 'N/A'), 'pm10': comp.get('pm10', 'N/A'), 'no': comp.get('no', 'N/A'), 'no2': comp.get('no2', 'N/A'), 'so2': comp.get('so2', 'N/A'), 'co': comp.get('co', 'N/A'), 'o3': comp.get('o3', 'N/A'), 'nh3': comp.get('nh3', 'N/A'), 'dt': dt_timestamp, 'updated': datetime.fromtimestamp(dt_timestamp).strftime('%d %b %Y, %I:%M %p') if dt_timestamp else 'N/A'}
+        if stale: result['stale'] = True
+        else:
+            recorder.record(city_name_display, lat, lon, dt_timestamp, comp, aqi_value)
+            for listener in snapshot_listeners: listener(result)
+        month = datetime.fromtimestamp(dt_timestamp).month if dt_timestamp else datetime.now().month
+        vs_typical = compare_to_typical(current_app.config.get('CLIMATOLOGY_PATH'), city_name_display, aqi_value, month)
+        if vs_typical: result['vs_typical'] = vs_typical
         logging.debug(f"AQI Result for {city_name_display}: {result}"); return result
     except requests.exceptions.Timeout: logging.error(f"Air Pollution API request timed out for ({lat}, {lon})"); return {'error': 'Air pollution service timed out.'}
     except requests.exceptions.RequestException as e: logging.error(f"Air Pollution API request error for ({lat}, {lon}): {e}"); return {'error': f'Could not connect to air pollution service: {e}'}
@@ -104,7 +342,7 @@ def fetch_aqi(lat, lon, city_name_display):
 
 # --- REMOVED key_prefix ---
 # --- @cache.cached(timeout=900) # Let Flask-Caching use args for key
-def fetch_weather(lat, lon, city_name_display):
+def fetch_weather(lat, lon, city_name_display, priority='interactive'):
     # Cache key will now be based on function name + lat + lon + city_name_display
     logging.debug(f"Fetching Weather for {city_name_display} ({lat}, {lon})")
     # ... (rest of function is correct) ...
@@ -113,8 +351,7 @@ def fetch_weather(lat, lon, city_name_display):
     if not api_key: logging.error("OPENWEATHER_API_KEY not configured for fetch_weather."); return {'error': 'Server configuration error: API key missing.'}
     params = {'lat': lat, 'lon': lon, 'appid': api_key, 'units': 'metric'}
     try:
-        response = requests.get(url, params=params, timeout=10); response.raise_for_status()
-        data = response.json()
+        data, stale = _upstream_json('weather', url, params, timeout=10, priority=priority)
         sys_data = data.get('sys', {}); tz_shift = data.get('timezone', 0)
         try: tz = timezone(timedelta(seconds=int(tz_shift)))
         except ValueError: logging.warning(f"Invalid timezone offset {tz_shift} for ({lat}, {lon}), using UTC."); tz = timezone.utc
@@ -122,13 +359,49 @@ def fetch_weather(lat, lon, city_name_display):
         sunrise = datetime.fromtimestamp(sunrise_ts, tz=tz).strftime('%I:%M %p') if sunrise_ts else 'N/A'
         sunset = datetime.fromtimestamp(sunset_ts, tz=tz).strftime('%I:%M %p') if sunset_ts else 'N/A'
         main_data = data.get('main', {}); wind_data = data.get('wind', {}); weather_list = data.get('weather', [{}]); weather_info = weather_list[0] if weather_list else {}
-        result = {'temp': round(main_data.get('temp', 0)), 'feels_like': round(main_data.get('feels_like', 0)), 'pressure': main_data.get('pressure', 'N/A'), 'humidity': main_data.get('humidity', 'N/A'), 'wind_speed': round(wind_data.get('speed', 0) * 3.6, 1), 'visibility': round(data.get('visibility', 10000) / 1000, 1), 'description': weather_info.get('description', 'N/A').title(), 'icon': weather_info.get('icon', '01d'), 'sunrise': sunrise, 'sunset': sunset}
+        result = {'temp': round(main_data.get('temp', 0)), 'feels_like': round(main_data.get('feels_like', 0)), 'pressure': main_data.get('pressure', 'N/A'), 'humidity': main_data.get('humidity', 'N/A'), 'wind_speed': round(wind_data.get('speed', 0) * 3.6, 1), 'visibility': round(data.get('visibility', 10000) / 1000, 1), 'description': weather_info.get('description', 'N/A').title(), 'icon': weather_info.get('icon', '01d'), 'sunrise': sunrise, 'sunset': sunset, 'dt': data.get('dt')}
+        if stale: result['stale'] = True
         logging.debug(f"Weather Result for {city_name_display}: {result}"); return result
     except requests.exceptions.Timeout: logging.error(f"Weather API request timed out for ({lat}, {lon})"); return {'error': 'Weather service timed out.'}
     except requests.exceptions.RequestException as e: logging.error(f"Weather API request error for ({lat}, {lon}): {e}"); return {'error': f'Weather data unavailable: {e}'}
     except Exception as e: logging.exception(f"Unexpected error in fetch_weather for {city_name_display} ({lat}, {lon}): {e}"); return {'error': 'An unexpected error occurred fetching weather.'}
 
 
+# --- Batched AQI Snapshots (favorites overview) ---
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
+
+def _get_batch_pool():
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is None:
+            _batch_pool = ThreadPoolExecutor(max_workers=current_app.config.get('BATCH_FETCH_WORKERS', 8), thread_name_prefix='aqi-batch')
+        return _batch_pool
+
+def _snapshot_for_city(app, city_name, priority):
+    with app.app_context():
+        coords = get_coords_from_city(city_name, priority=priority)
+        if 'error' in coords: return coords
+        return fetch_aqi(coords['lat'], coords['lon'], coords['name'], priority=priority)
+
+def fetch_aqi_batch(city_names, priority='interactive'):
+    """Geocodes and fetches current AQI for many cities concurrently; returns {city name: fetch_aqi result}.
+
+    Each lookup goes through the upstream cache and budget like a single fetch, so cached snapshots cost
+    nothing. The whole batch waits at most BATCH_FETCH_TIMEOUT seconds; slower cities get an error entry.
+    """
+    app = current_app._get_current_object()
+    names = list(dict.fromkeys(c.strip() for c in city_names if c and c.strip()))
+    futures = {name: _get_batch_pool().submit(_snapshot_for_city, app, name, priority) for name in names}
+    done, _ = wait(futures.values(), timeout=app.config.get('BATCH_FETCH_TIMEOUT', 8))
+    results = {}
+    for name, future in futures.items():
+        if future not in done: future.cancel(); logging.warning(f"Batch AQI fetch timed out for {name}"); results[name] = {'error': 'AQI lookup timed out.'}
+        elif future.exception(): logging.error(f"Batch AQI fetch failed for {name}: {future.exception()}"); results[name] = {'error': 'An unexpected error occurred fetching AQI.'}
+        else: results[name] = future.result()
+    return results
+
+
 # --- Weather-only forecast helper (No Changes Needed) ---
 # ... ( _process_daily_forecast function remains the same) ...
 def _process_daily_forecast(forecast_list):
@@ -190,15 +463,14 @@ def _process_daily_forecast(forecast_list):
 
 
 # NO @cache.cached(...) decorator
-def fetch_forecast(lat, lon):
+def fetch_forecast(lat, lon, priority='interactive'):
     logging.debug(f"Fetching Weather Forecast ({lat}, {lon})")
     api_key = current_app.config.get('OPENWEATHER_API_KEY')
     url = "http://api.openweathermap.org/data/2.5/forecast"
     if not api_key: logging.error("OPENWEATHER_API_KEY not configured for fetch_forecast."); return [], [] # Return two empty lists
     params = {'lat': lat, 'lon': lon, 'appid': api_key, 'units': 'metric'}
     try:
-        response = requests.get(url, params=params, timeout=10); response.raise_for_status()
-        api_response_data = response.json(); full_forecast_list = api_response_data.get('list', [])
+        api_response_data, _ = _upstream_json('forecast', url, params, timeout=10, priority=priority); full_forecast_list = api_response_data.get('list', [])
         if not full_forecast_list: logging.warning(f"Weather forecast API returned empty list for ({lat}, {lon})"); return [], []
         # Process returns two lists now
         daily_summary, hourly_slice = _process_daily_forecast(full_forecast_list)
@@ -210,22 +482,29 @@ def fetch_forecast(lat, lon):
 
 # --- Historical AQI Fetching & Simulation (No Changes Needed) ---
 # ... (fetch_historical_aqi and _simulate_historical_if_needed functions remain the same) ...
-def fetch_historical_aqi(lat, lon):
+def fetch_historical_aqi(lat, lon, priority='interactive', city_name=None):
     logging.debug(f"Fetching Historical AQI ({lat}, {lon})")
     api_key = current_app.config.get('OPENWEATHER_API_KEY')
     url = "http://api.openweathermap.org/data/2.5/air_pollution/history"
     if not api_key: logging.error("OPENWEATHER_API_KEY not configured..."); logging.warning(f"Simulating historical AQI..."); return _simulate_historical_if_needed([])
-    end_time_dt = datetime.now(timezone.utc); start_time_dt = end_time_dt - timedelta(hours=24)
+    # Window is aligned to the hour so repeated requests share one cached upstream response
+    end_time_dt = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0); start_time_dt = end_time_dt - timedelta(hours=24)
     end_time = int(end_time_dt.timestamp()); start_time = int(start_time_dt.timestamp())
+    # Serve from readings already recorded for this location when they cover the window
+    recorded = recorder.recent_hourly(lat, lon, since=start_time)
+    if len(recorded) >= 20:
+        logging.debug(f"Historical AQI served from {len(recorded)} recorded hourly readings.")
+        return [{'hour': datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%H:00'), 'aqi': aqi} for ts, aqi in recorded]
     params = {'lat': lat, 'lon': lon, 'start': start_time, 'end': end_time, 'appid': api_key}
     try:
-        response = requests.get(url, params=params, timeout=15); response.raise_for_status()
-        data = response.json().get('list', [])
+        response_data, stale = _upstream_json('history', url, params, timeout=15, priority=priority)
+        data = response_data.get('list', [])
         historical = []
         for entry in data:
             components = entry.get('components'); dt_ts = entry.get('dt')
             if components is not None and dt_ts is not None:
                 aqi_value, _ = calculate_indian_aqi(components)
+                if not stale: recorder.record(city_name, lat, lon, dt_ts, components, aqi_value)
                 historical.append({'dt': dt_ts, 'hour': datetime.fromtimestamp(dt_ts, tz=timezone.utc).strftime('%H:00'), 'aqi': aqi_value})
             else: logging.warning(f"Skipping historical entry: {entry}")
         historical.sort(key=lambda x: x['dt'])
@@ -243,6 +522,7 @@ def fetch_historical_aqi(lat, lon):
 
 def _simulate_historical_if_needed(partial_data):
     logging.debug(f"Simulating historical AQI data. Based on {len(partial_data)} real points.")
+    _mark_degraded()
     base_aqi = 50
     if partial_data:
         valid_aqi_values = [item['aqi'] for item in reversed(partial_data) if isinstance(item.get('aqi'), (int, float))]
@@ -283,6 +283,7 @@ function updateHealthSummary(aqiData) {
             <div class="text-2xl font-semibold ${categoryInfo.textColor}">${categoryInfo.category}</div>
              <p class="text-slate-400 text-sm mt-1">(${cityName})</p>
             <p class="text-slate-400 text-sm mt-1">${categoryInfo.description}</p>
+            ${aqiData.vs_typical ? `<p class="text-slate-400 text-xs mt-1">${aqiData.vs_typical.label} (typical for this month: ${aqiData.vs_typical.typical_aqi})</p>` : ''}
         </div>
     `;
     // --- END REMOVED COMMENTS ---
@@ -622,6 +623,7 @@ async function updateDashboard(city) {
         drawCharts(aqi, historical && !historical.error ? historical : [], forecastData.hourly || []);
 
         contentEl.classList.remove('hidden');
+        startLiveUpdates(officialCityName);
 
     } catch (e) {
         console.error('Dashboard update failed:', e);
@@ -642,6 +644,36 @@ async function updateDashboard(city) {
 }
 // --- END MODIFY updateDashboard ---
 
+// --- Live AQI updates (server-sent events) ---
+let liveSource = null;
+
+function startLiveUpdates(city) {
+    if (typeof EventSource === 'undefined') return;
+    if (liveSource) liveSource.close();
+    liveSource = new EventSource(`/api/live/subscribe?city=${encodeURIComponent(city)}`);
+
+    const applyLiveData = (eventCity, data) => {
+        document.dispatchEvent(new CustomEvent('aqi-live-update', { detail: { city: eventCity, data } }));
+        if (eventCity.toLowerCase() !== city.toLowerCase() || !currentDashboardData.aqi) return;
+        currentDashboardData.aqi = { ...currentDashboardData.aqi, ...data };
+        updateHealthSummary(currentDashboardData.aqi);
+        updatePollutants(currentDashboardData.aqi);
+    };
+
+    liveSource.addEventListener('snapshot', (e) => {
+        const payload = JSON.parse(e.data);
+        applyLiveData(payload.city, payload.data);
+    });
+    liveSource.addEventListener('update', (e) => {
+        const payload = JSON.parse(e.data);
+        applyLiveData(payload.city, payload.changes);
+    });
+    // A refused stream (503 at capacity) closes the source; the page keeps working without live updates
+    liveSource.onerror = () => console.warn(liveSource.readyState === EventSource.CLOSED
+        ? 'Live AQI updates unavailable right now.' : 'Live AQI stream interrupted; browser will retry.');
+}
+// --- END Live AQI updates ---
+
 function exportData() {
     if (!currentDashboardData.aqi || currentDashboardData.aqi.error) {
         showToast('No current data available to export.', true);
@@ -809,12 +841,12 @@ function renderTopCitiesList(containerId, citiesData) {
     });
 }
 
-async function loadAndRenderTopCities() {
-    // Show loading state in both lists initially
+async function loadAndRenderTopCities(isRetry = false) {
+    // Show loading state in both lists initially (retries keep the partial lists on screen)
     const indiaList = document.getElementById('top-indian-cities-list');
     const worldList = document.getElementById('top-world-cities-list');
-    if (indiaList) indiaList.innerHTML = `<p class="text-slate-400 text-sm p-4 text-center">Loading Indian cities data...</p>`;
-    if (worldList) worldList.innerHTML = `<p class="text-slate-400 text-sm p-4 text-center">Loading world cities data...</p>`;
+    if (!isRetry && indiaList) indiaList.innerHTML = `<p class="text-slate-400 text-sm p-4 text-center">Loading Indian cities data...</p>`;
+    if (!isRetry && worldList) worldList.innerHTML = `<p class="text-slate-400 text-sm p-4 text-center">Loading world cities data...</p>`;
 
     try {
         console.log("Fetching top cities AQI data...");
@@ -828,6 +860,14 @@ async function loadAndRenderTopCities() {
         renderTopCitiesList('top-indian-cities-list', data.india || []);
         renderTopCitiesList('top-world-cities-list', data.world || []);
 
+        // The server ranks cities in the background after startup; poll until the first pass is done
+        if (data.warming) {
+            const collecting = `<p class="text-slate-400 text-sm p-4 text-center">Collecting city data...</p>`;
+            if (indiaList && !(data.india || []).length) indiaList.innerHTML = collecting;
+            if (worldList && !(data.world || []).length) worldList.innerHTML = collecting;
+            setTimeout(() => loadAndRenderTopCities(true), 15000);
+        }
+
     } catch (error) {
         console.error("Error loading top cities AQI:", error);
         // Show error in both lists
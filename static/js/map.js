@@ -237,6 +237,44 @@ function renderLegend(layerCode) {
         }
     }
 
+    // --- Interpolated AQI Heatmap (one cached binary fetch, drawn client-side) ---
+    async function loadAqiHeatmap() {
+        try {
+            const response = await fetch('/api/aqi_grid');
+            if (!response.ok) return; // Grid not built yet; markers still work
+            const buffer = await response.arrayBuffer();
+            // Header: 'AQIG', width, height (uint16), south, west, lat step, lon step (float32), little endian
+            const view = new DataView(buffer);
+            const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+            if (magic !== 'AQIG') throw new Error('Unexpected AQI grid format');
+            const width = view.getUint16(4, true), height = view.getUint16(6, true);
+            const south = view.getFloat32(8, true), west = view.getFloat32(12, true);
+            const dLat = view.getFloat32(16, true), dLon = view.getFloat32(20, true);
+            const cells = new DataView(buffer, 24);
+
+            const canvas = document.createElement('canvas');
+            canvas.width = width; canvas.height = height;
+            const ctx = canvas.getContext('2d');
+            const image = ctx.createImageData(width, height);
+            const rgbCache = {};
+            for (let i = 0; i < width * height; i++) {
+                const aqi = cells.getUint16(i * 2, true);
+                if (aqi === 65535) continue; // No station within range: leave transparent
+                const color = getAqiStyle(aqi).color;
+                const rgb = rgbCache[color] || (rgbCache[color] = [1, 3, 5].map(o => parseInt(color.substr(o, 2), 16)));
+                image.data.set([...rgb, 255], i * 4);
+            }
+            ctx.putImageData(image, 0, 0);
+
+            // Cells are centred on grid points (north row first), so the image extends half a cell past them
+            const north = south + (height - 1) * dLat, east = west + (width - 1) * dLon;
+            const bounds = [[south - dLat / 2, west - dLon / 2], [north + dLat / 2, east + dLon / 2]];
+            L.imageOverlay(canvas.toDataURL(), bounds, { opacity: 0.35, interactive: false }).addTo(map);
+        } catch (error) {
+            console.error('Error in loadAqiHeatmap:', error);
+        }
+    }
+
     const searchInput = document.getElementById('mapSearchInput');
     const searchButton = document.getElementById('mapSearchButton');
 
@@ -259,16 +297,6 @@ function renderLegend(layerCode) {
         } catch (error) {
             console.error("Error during performSearch:", error);
             if (typeof showToast !== 'undefined') { showToast(error.message || `Could not find data for "${cityName}".`, true); }
-
-            // Fallback: Try to fly to location using Geocoding API
-            try {
-                 if (!API_KEY) return;
-                 const geoResponse = await fetch(`http://api.openweathermap.org/geo/1.0/direct?q=${encodeURIComponent(cityName)}&limit=1&appid=${API_KEY}`);
-                 if (geoResponse.ok) {
-                     const geoData = await geoResponse.json();
-                     if (geoData && geoData.length > 0) map.flyTo([geoData[0].lat, geoData[0].lon], 10);
-                 }
-            } catch (geoError) { console.error("Geocoding fallback failed:", geoError); }
         } finally {
              searchInput.disabled = false;
              if (searchButton) searchButton.innerHTML = '<i class="fas fa-search"></i>';
@@ -285,5 +313,6 @@ function renderLegend(layerCode) {
         searchButton.addEventListener('click', async (e) => { e.preventDefault(); await performSearch(); });
     }
 
+    loadAqiHeatmap();
     loadInitialCities(); 
 });
\ No newline at end of file